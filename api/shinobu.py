@@ -2,30 +2,76 @@ import logging
 import os
 import re
 import traceback
+from collections import Iterable
+from typing import Optional
 
+import aiohttp
 import discord
 from discord.ext import commands
 
 from api.expected_errors import ExpectedCommandError
 from api.my_context import Context
-from utils import database
+from utils import database, schema
+from utils.series_metadata import SeriesMetadata
 
 logger = logging.getLogger(__name__)
 
+USER_INSERT_CHUNK_SIZE = 1000
+# Connections of the shared HTTP session, kept alive between requests
+HTTP_CONNECTIONS = 100
+HTTP_CONNECTIONS_PER_HOST = 10
+HTTP_KEEPALIVE = 30
+DNS_CACHE_TTL = 300
+
 
 class Shinobu(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db = database.AsyncDB()
+        self.series_metadata = SeriesMetadata(self.db)
+        # Shared by all cogs, so that they reuse each other's connections. Created once the event loop runs
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Users are never deleted, so once known they don't need to be inserted again
+        self._known_user_ids: Optional[set[int]] = None
+
+    async def start(self, *args, **kwargs):
+        await self.db.run(schema.migrate)
+        connector = aiohttp.TCPConnector(limit=HTTP_CONNECTIONS, limit_per_host=HTTP_CONNECTIONS_PER_HOST,
+                                         keepalive_timeout=HTTP_KEEPALIVE, ttl_dns_cache=DNS_CACHE_TTL)
+        self.session = aiohttp.ClientSession(connector=connector)
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        await super().close()
+        if self.session is not None:
+            await self.session.close()
+        self.db.close()
+
     async def on_ready(self):
-        await self.update_user_database()
+        await self.update_user_database(m.id for g in self.guilds for m in g.members)
         await self.reload_all_extensions()
         logger.info(f'Logged on as {self.user}!')
 
-    async def on_member_join(self, _: discord.Member):
-        await self.update_user_database()
+    async def on_member_join(self, member: discord.Member):
+        await self.update_user_database([member.id])
+
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.update_user_database(m.id for m in guild.members)
+
+    async def update_user_database(self, user_ids: Iterable[int]):
+        """Make sure that all the users exist in the database."""
+        user_ids = set(user_ids)
+        if self._known_user_ids is None:
+            self._known_user_ids = {row[0] for row in await self.db.fetchall('SELECT id FROM user')}
 
-    async def update_user_database(self):
-        with database.connect() as db:
-            db.executemany('INSERT OR IGNORE INTO user(id) VALUES(?)',
-                           [[m.id] for g in self.guilds for m in g.members])
+        missing = sorted(user_ids - self._known_user_ids)
+        # Every chunk is committed on its own so that other writes don't have to wait for all of them
+        for i in range(0, len(missing), USER_INSERT_CHUNK_SIZE):
+            chunk = missing[i:i + USER_INSERT_CHUNK_SIZE]
+            await self.db.executemany('INSERT OR IGNORE INTO user(id) VALUES(?)', [[user_id] for user_id in chunk])
+            self._known_user_ids.update(chunk)
+        if missing:
+            logger.info(f'added {len(missing)} new users to the database')
 
     async def reload_all_extensions(self):
         async for ext in self._extension_modules():
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Memory held per cached booru query: the provider JSON dicts that used to be cached vs. slim Post records.
+
+The responses are synthetic but shaped like those of gelbooru (1000 posts) and a reddit listing (100 children).
+
+Run from the repository root: python -m benchmarks.booru_posts
+"""
+import json
+import random
+import tracemalloc
+
+from extensions.booru.boorusources import SOURCES
+
+WORDS = ['long_hair', 'blush', 'smile', 'short_hair', 'open_mouth', 'blue_eyes', 'skirt', 'blonde_hair', 'brown_hair',
+         'thighhighs', 'red_eyes', 'black_hair', 'hat', 'ribbon', 'bow', 'dress', 'animal_ears', 'twintails',
+         'school_uniform', 'gloves', 'sitting', 'solo', '1girl', 'highres', 'simple_background', 'white_background']
+
+
+def gelbooru_response(rng: random.Random, posts=1000) -> str:
+    return json.dumps([{
+        'source': '', 'directory': f'{rng.randrange(256):02x}/{rng.randrange(256):02x}', 'hash': f'{rng.getrandbits(128):032x}',
+        'height': 1200, 'id': rng.randrange(10**7), 'image': f'{rng.getrandbits(128):032x}.jpg', 'change': 1600000000,
+        'owner': 'danbooru', 'parent_id': None, 'rating': rng.choice('sqe'), 'sample': 1, 'sample_height': 850,
+        'sample_width': 850, 'score': rng.randrange(100), 'tags': ' '.join(rng.sample(WORDS, 15)), 'width': 1200,
+        'file_url': f'https://img2.gelbooru.com/images/{rng.getrandbits(128):032x}.jpg',
+        'created_at': 'Sat Apr 24 12:00:00 -0500 2021', 'status': 'active', 'has_notes': False,
+        'has_comments': False, 'preview_url': 'https://img2.gelbooru.com/thumbnails/x.jpg', 'title': '',
+        'creator_id': rng.randrange(10**6), 'post_locked': 0, 'has_children': False,
+    } for _ in range(posts)])
+
+
+def reddit_response(rng: random.Random, children=100) -> str:
+    def child():
+        data = {f'field_{i}': rng.choice([None, False, 0, 'text', 1.5]) for i in range(90)}
+        data.update(url=f'https://i.imgur.com/{rng.getrandbits(40):x}.jpg', permalink=f'/r/hentai/comments/{rng.getrandbits(32):x}/',
+                    author=f'user{rng.randrange(10**5)}', score=rng.randrange(1000), subreddit_name_prefixed='r/hentai',
+                    title=' '.join(rng.sample(WORDS, 8)), preview={'images': [{'source': {'url': 'x', 'width': 1, 'height': 1},
+                                                                               'resolutions': [{'url': 'y'}] * 6}]})
+        return {'kind': 't3', 'data': data}
+
+    return json.dumps({'kind': 'Listing', 'data': {'children': [child() for _ in range(children)]}})
+
+
+def legacy_parse_gelbooru(content):
+    for item in content:
+        item["post_link"] = "https://gelbooru.com/index.php?page=post&s=view&id=" + str(item["id"])
+        item["author"] = item["owner"]
+        item["provider"] = "Gelbooru"
+    return content
+
+
+def legacy_parse_reddit(content):
+    children = content["data"]["children"]
+    for item in children:
+        item["file_url"] = item["data"]["url"]
+        item["provider"] = "Reddit"
+        item["rating"] = "explicit"
+        item["post_link"] = "https://reddit.com" + item["data"]["permalink"]
+        item["score"] = item["data"]["score"]
+        item["tags"] = item["data"]["title"]
+        item["author"] = item["data"]["author"]
+    return children
+
+
+def parse(board, items):
+    return [post for item in items if (post := board.parse(item)) is not None]
+
+
+def retained_kib(response: str, parse) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    posts = parse(json.loads(response))
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del posts
+    return retained / 1024
+
+
+def main():
+    rng = random.Random(0)
+    gelbooru, reddit = gelbooru_response(rng), reddit_response(rng)
+    for name, response, legacy, slim in [
+        ('gelbooru, 1000 posts', gelbooru, legacy_parse_gelbooru, lambda c: parse(SOURCES['gel'], c)),
+        ('reddit, 100 posts', reddit, legacy_parse_reddit, lambda c: parse(SOURCES['hentai'], c['data']['children'])),
+    ]:
+        print(f'{name:<22} JSON dicts: {retained_kib(response, legacy):8.0f} KiB'
+              f'   Post records: {retained_kib(response, slim):8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
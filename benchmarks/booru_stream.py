@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Peak memory and time to turn a 1000-post booru response into posts: buffered json.loads vs. iter_json_array.
+
+Run from the repository root: python -m benchmarks.booru_stream
+"""
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.booru_posts import gelbooru_response, parse
+from extensions.booru.boorurequests import iter_json_array
+from extensions.booru.boorusources import SOURCES
+from extensions.booru.CONSTANTS import STREAM_CHUNK_SIZE, BOARD_POST_LIMIT
+
+
+async def chunked(body: bytes):
+    for i in range(0, len(body), STREAM_CHUNK_SIZE):
+        yield body[i:i + STREAM_CHUNK_SIZE]
+
+
+async def buffered(body: bytes, limit=None):
+    return parse(SOURCES['gel'], json.loads(b''.join([chunk async for chunk in chunked(body)])))
+
+
+async def streamed(body: bytes, limit=None):
+    posts = []
+    async for item in iter_json_array(chunked(body)):
+        if (post := SOURCES['gel'].parse(item)) is not None:
+            posts.append(post)
+            if len(posts) == limit:
+                break
+    return posts
+
+
+def measure(read, body: bytes, limit=None):
+    tracemalloc.start()
+    start = time.perf_counter()
+    posts = asyncio.run(read(body, limit))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(posts), elapsed * 1000, peak / 1024
+
+
+def main():
+    body = gelbooru_response(random.Random(0)).encode()
+    print(f'response of {len(body) / 1024:.0f} KiB, read in {STREAM_CHUNK_SIZE // 1024} KiB chunks')
+    for name, read, limit in [('json.loads', buffered, None), ('iter_json_array', streamed, None),
+                               (f'iter_json_array, stop at {BOARD_POST_LIMIT}', streamed, BOARD_POST_LIMIT)]:
+        posts, ms, peak_kib = measure(read, body, limit)
+        print(f'  {name:<30} {posts:>5} posts {ms:8.1f}ms  peak {peak_kib:7.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Latency of `.catalog <query>` over 500k characters: the catalog index vs. scanning the table with LIKE.
+
+Run from the repository root: python -m benchmarks.catalog_search
+"""
+import random
+import time
+from typing import List
+
+from benchmarks import synthetic
+from utils import schema
+from utils.catalog import CatalogIndex
+
+
+def mean_ms(func, queries: List[str]) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        func(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main(characters=500_000, queries=50):
+    db = synthetic.create(characters=characters, users=1, waifus_per_user=0)
+    schema.migrate(db)
+    names = [row[0] for row in db.execute('SELECT name FROM character')]
+    rng = random.Random(0)
+    # A full first name and a prefix of the last name, like people tend to type them
+    queries = [f'{first} {last[:3]}' for first, last in (name.split() for name in rng.sample(names, queries))]
+
+    start = time.perf_counter()
+    index = CatalogIndex.load(db)
+    build = time.perf_counter() - start
+
+    def like(q: str):
+        first, last = q.split()
+        return db.execute("SELECT * FROM character WHERE (name LIKE ? OR series LIKE ?) AND name LIKE ? LIMIT 100",
+                          [f'%{first}%', f'%{first}%', f'%{last}%']).fetchall()
+
+    print(f'LIKE scan:   {mean_ms(like, queries):8.1f} ms per query')
+    print(f'index:       {mean_ms(lambda q: index.search(q, 100), queries):8.1f} ms per query')
+    print(f'index build: {build:8.1f} s')
+
+    db.execute("UPDATE character SET name='Updated Name' WHERE id < 100")
+    start = time.perf_counter()
+    index.apply(CatalogIndex.load_changes(db, index.last_change))
+    print(f'refresh of 100 changed characters: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
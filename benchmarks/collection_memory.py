@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""Resident memory held by a listed 50k waifu collection.
+
+Run from the repository root (Linux only): python -m benchmarks.collection_memory
+"""
+import gc
+import os
+
+from benchmarks import synthetic
+from utils.waifus import list_waifus
+
+
+def rss() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def main(waifus=50_000):
+    db = synthetic.create(characters=waifus, users=1, waifus_per_user=waifus)
+    list_waifus(db, 0)  # warm up sqlite's page cache so that it isn't counted below
+
+    gc.collect()
+    before = rss()
+    collection = list_waifus(db, 0)
+    gc.collect()
+    after = rss()
+
+    print(f'{len(collection)} waifus: {(after - before) / 2**20:.1f} MiB RSS,'
+          f' {(after - before) / len(collection):.0f} bytes per waifu')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Pulls per second of the alias-table pack sampler vs. the previous SQL-per-pull implementation.
+
+Run from the repository root: python -m benchmarks.pack_pulls
+"""
+import random
+import time
+from typing import Tuple
+
+from benchmarks import synthetic
+from utils import schema
+from utils.database import DB, Rarity, Character
+from utils.waifus import pick_from_pack
+
+
+def legacy_pick_from_pack(db: DB, pack_name: str) -> Tuple[Character, Rarity]:
+    rarities = db.execute('SELECT * FROM rarity').fetchall()
+    rarity = Rarity.build(**random.choices(rarities, weights=[r['weight'] for r in rarities])[0])
+    chars = [dict(c) for c in db.execute("""
+    SELECT character.id,
+           character.name,
+           character.image_url,
+           character.series,
+           character.rarity AS 'rarity.value',
+           character.batch AS 'batch.name',
+           MAX(batch_in_pack.weight) AS __weight__
+    FROM character
+    JOIN batch_in_pack      ON batch_in_pack.batch = character.batch
+    JOIN rarity             ON rarity.value >= character.rarity
+    WHERE batch_in_pack.pack = ? AND rarity.value = ?
+    GROUP BY character.id
+    """, [pack_name, rarity.value])]
+    weights = [c.pop('__weight__') for c in chars]
+    return Character.build(**random.choices(chars, weights=weights)[0]), rarity
+
+
+def pulls_per_second(func, db: DB, seconds: float) -> float:
+    pulls = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        func(db, 'Standard')
+        pulls += 1
+    return pulls / elapsed
+
+
+def main(characters=100_000):
+    db = synthetic.create(characters=characters, users=0)
+    schema.migrate(db)
+
+    start = time.perf_counter()
+    pick_from_pack(db, 'Standard')
+    print(f'sampler build:   {time.perf_counter() - start:.3f}s for {characters} characters')
+
+    print(f'legacy:  {pulls_per_second(legacy_pick_from_pack, db, 10):>12,.1f} pulls/s')
+    print(f'sampler: {pulls_per_second(pick_from_pack, db, 2):>12,.1f} pulls/s')
+
+
+if __name__ == '__main__':
+    main()
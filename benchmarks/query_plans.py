@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Check that none of the hot queries scans a whole table once the indexes of utils.schema exist.
+
+Exits with status 1 if any of them does, so it can gate changes to the queries or the schema.
+Checks a synthetic database by default or the database at the given path.
+
+Run from the repository root: python -m benchmarks.query_plans [path/to/shinobu.db]
+"""
+import sys
+from typing import Dict, List
+
+from benchmarks import synthetic
+from extensions.economy import BIRTHDAY_QUERY, RECORDED_MEDIA_QUERY
+from utils import database, schema
+from utils.mal_rss import CONSUMED_MEDIA_QUERY
+from utils.series_metadata import SERIES_METADATA_QUERY
+from utils.waifus import LIST_WAIFUS_QUERY, OWNED_CHARACTERS_QUERY, PACK_CHARACTERS_QUERY, CURRENT_PACK_QUERY
+
+HOT_QUERIES = {
+    'list_waifus': (LIST_WAIFUS_QUERY, [1]),
+    'give_waifus': (OWNED_CHARACTERS_QUERY.format('?,?,?'), [1, 1, 2, 3]),
+    'PackSampler.load': (PACK_CHARACTERS_QUERY, ['Standard']),
+    'PackSampler.load (event)': (PACK_CHARACTERS_QUERY, ['Event']),
+    'buy_packs': (CURRENT_PACK_QUERY, ['Standard']),
+    'new_mal_content': (CONSUMED_MEDIA_QUERY, ['anime', 1]),
+    'Economy.birthday': (BIRTHDAY_QUERY, []),
+    'record_rewards': (RECORDED_MEDIA_QUERY, [1]),
+    'SeriesMetadata.fill': (SERIES_METADATA_QUERY, ['https://myanimelist.net/anime/1']),
+}
+
+
+def check(db: database.DB) -> Dict[str, List[str]]:
+    """The tables each of the hot queries scans fully, for those that do."""
+    return {name: scans for name, (sql, parameters) in HOT_QUERIES.items()
+            if (scans := schema.full_scans(db, sql, parameters))}
+
+
+def main():
+    if len(sys.argv) > 1:
+        db = database.connect(sys.argv[1])
+    else:
+        db = synthetic.create(characters=10_000, users=1_000, waifus_per_user=20)
+    schema.migrate(db)
+
+    failures = check(db)
+    for name in HOT_QUERIES:
+        print(f"{name:<26} {'scans ' + ', '.join(failures[name]) if name in failures else 'ok'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Time to list a 10k waifu collection with cached hydration plans vs. per-row tree building.
+
+Run from the repository root: python -m benchmarks.row_hydration
+"""
+import time
+from collections import defaultdict
+from typing import Any, Dict, Tuple, Type
+
+from benchmarks import synthetic
+from utils.database import RowData, Waifu
+from utils.waifus import list_waifus
+
+
+def nested_dict() -> defaultdict:
+    return defaultdict(nested_dict)
+
+
+def legacy_from_tree(cls: Type[RowData], tree: Dict[str, Any]) -> RowData:
+    for key, value in tree.copy().items():
+        if isinstance(value, dict):
+            tree[key] = legacy_from_tree(RowData._find_subclass(key.capitalize()), value)
+    return cls(**tree)
+
+
+def legacy_build(cls: Type[RowData], **kwargs) -> RowData:
+    tree = nested_dict()
+    for name, value in kwargs.items():
+        subnames = name.split('.')
+        subtree = tree
+        for subtree_name in subnames[:-1]:
+            subtree = subtree[subtree_name]
+        subtree[subnames[-1]] = value
+    return legacy_from_tree(cls, tree)
+
+
+def best_of(func, repeat=5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy_hydration_plan(columns: Tuple[str, ...]):
+    return lambda row, _: legacy_build(Waifu, **dict(zip(columns, row)))
+
+
+def main(waifus=10_000):
+    db = synthetic.create(characters=waifus, users=1, waifus_per_user=waifus)
+
+    planned = best_of(lambda: list_waifus(db, 0))
+    Waifu.hydration_plan = legacy_hydration_plan
+    try:
+        legacy = best_of(lambda: list_waifus(db, 0))
+    finally:
+        del Waifu.hydration_plan
+
+    print(f'legacy build:   {legacy * 1000:8.1f} ms for list_waifus with {waifus} waifus')
+    print(f'hydration plan: {planned * 1000:8.1f} ms for list_waifus with {waifus} waifus')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Latency of the hot queries as users, characters and waifus grow, with and without the indexes of utils.schema.
+
+Run from the repository root: python -m benchmarks.schema_scaling
+"""
+import time
+
+from benchmarks import synthetic
+from benchmarks.query_plans import HOT_QUERIES
+from utils import schema
+
+SCALES = [
+    # characters, users, waifus per user
+    (1_000, 100, 20),
+    (10_000, 1_000, 50),
+    (100_000, 5_000, 100),
+]
+
+
+def mean_ms(db, sql: str, parameters, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.execute(sql, parameters).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(repeat=20):
+    print(f"{'characters':>10} {'users':>6} {'waifus':>8}  {'query':<26} {'no index':>10} {'indexed':>10}")
+    for characters, users, waifus_per_user in SCALES:
+        db = synthetic.create(characters=characters, users=users, waifus_per_user=waifus_per_user)
+        timings = {}
+        for indexed in False, True:
+            if indexed:
+                schema.migrate(db)
+            for name, (sql, parameters) in HOT_QUERIES.items():
+                timings[name, indexed] = mean_ms(db, sql, parameters, repeat)
+
+        for name in HOT_QUERIES:
+            print(f'{characters:>10} {users:>6} {users * waifus_per_user:>8}  {name:<26}'
+                  f' {timings[name, False]:>8.2f}ms {timings[name, True]:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic databases for the benchmarks, mirroring the schema of data/shinobu.db."""
+import random
+
+from utils import database
+
+SCHEMA = """
+CREATE TABLE user(id INTEGER PRIMARY KEY,
+                  balance INTEGER NOT NULL DEFAULT 0 CHECK(balance >= 0),
+                  last_withdrawal TEXT NOT NULL DEFAULT (DATETIME('now', 'localtime')),
+                  birthday TEXT,
+                  mal_username TEXT);
+CREATE TABLE rarity(value INTEGER PRIMARY KEY, name TEXT NOT NULL, colour INTEGER NOT NULL, weight REAL NOT NULL,
+                    refund INTEGER NOT NULL, upgrade_cost INTEGER, auto_upgrade BOOLEAN NOT NULL);
+CREATE TABLE batch(name TEXT PRIMARY KEY);
+CREATE TABLE character(id INTEGER PRIMARY KEY, name TEXT NOT NULL, image_url TEXT, series TEXT NOT NULL,
+                       rarity INTEGER NOT NULL REFERENCES rarity(value), batch TEXT NOT NULL REFERENCES batch(name));
+CREATE TABLE pack(name TEXT PRIMARY KEY, cost INTEGER NOT NULL, description TEXT, start_date TEXT NOT NULL,
+                  end_date TEXT);
+CREATE TABLE batch_in_pack(batch TEXT NOT NULL REFERENCES batch(name), pack TEXT NOT NULL REFERENCES pack(name),
+                           weight REAL NOT NULL, PRIMARY KEY(batch, pack));
+CREATE TABLE waifu(id INTEGER PRIMARY KEY, user INTEGER NOT NULL REFERENCES user(id),
+                   character INTEGER NOT NULL REFERENCES character(id),
+                   rarity INTEGER NOT NULL REFERENCES rarity(value), UNIQUE(user, character));
+CREATE TABLE consumed_media(user INTEGER NOT NULL REFERENCES user(id), type TEXT NOT NULL, id INTEGER NOT NULL,
+                            amount INTEGER NOT NULL, PRIMARY KEY(user, type, id));
+CREATE TABLE voice_to_text(voice_id INTEGER PRIMARY KEY, text_id INTEGER NOT NULL);
+"""
+
+RARITIES = [
+    # value, name, colour, weight, refund, upgrade_cost, auto_upgrade
+    (1, 'Common', 0x9d9d9d, 60, 5, 20, True),
+    (2, 'Rare', 0x0070dd, 25, 10, 50, True),
+    (3, 'Epic', 0xa335ee, 10, 25, 150, False),
+    (4, 'Legendary', 0xff8000, 4, 75, 500, False),
+    (5, 'Mythic', 0xe6cc80, 1, 250, None, False),
+]
+
+
+SYLLABLES = ['ka', 'ki', 'ku', 'ke', 'ko', 'sa', 'shi', 'su', 'se', 'so', 'ta', 'chi', 'tsu', 'te', 'to', 'na', 'ni',
+             'nu', 'ne', 'no', 'ha', 'hi', 'fu', 'he', 'ho', 'ma', 'mi', 'mu', 'me', 'mo', 'ya', 'yu', 'yo', 'ra', 'ri',
+             'ru', 're', 'ro', 'wa', 'n']
+
+
+def random_word(rng: random.Random) -> str:
+    return ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+
+
+def create(path=':memory:', characters=100_000, batches=20, users=100, waifus_per_user=50, consumed_per_user=20,
+           seed=0) -> database.DB:
+    rng = random.Random(seed)
+    db = database.connect(path)
+    db.executescript(SCHEMA)
+    with db:
+        db.executemany('INSERT INTO rarity VALUES(?,?,?,?,?,?,?)', RARITIES)
+        db.executemany('INSERT INTO batch(name) VALUES(?)', [(f'batch{b}',) for b in range(batches)])
+        db.executemany('INSERT INTO character VALUES(?,?,?,?,?,?)',
+                       [(c, f'{random_word(rng)} {random_word(rng)}', f'https://example.com/{c}.png',
+                         f'{random_word(rng)} no {random_word(rng)} {c // 25}',
+                         rng.choices([1, 2, 3, 4, 5], weights=[50, 25, 15, 7, 3])[0], f'batch{c % batches}')
+                        for c in range(characters)])
+        db.execute("INSERT INTO pack VALUES('Standard', 10, 'Every batch', '2000-01-01', NULL)")
+        db.executemany("INSERT INTO batch_in_pack VALUES(?, 'Standard', ?)",
+                       [(f'batch{b}', rng.uniform(.5, 2)) for b in range(batches)])
+        db.execute("INSERT INTO pack VALUES('Event', 25, 'Only the first batch', '2000-01-01', NULL)")
+        db.execute("INSERT INTO batch_in_pack VALUES('batch0', 'Event', 1)")
+        # Only some users set their birthday
+        db.executemany('INSERT INTO user(id, balance, birthday) VALUES(?, 1000000, ?)',
+                       [(u, f'2000-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}' if rng.random() < .2 else None)
+                        for u in range(users)])
+        db.executemany('INSERT INTO waifu(user, character, rarity) VALUES(?,?,?)',
+                       [(u, c, rng.randint(1, 5))
+                        for u in range(users)
+                        for c in rng.sample(range(characters), min(waifus_per_user, characters))])
+        db.executemany('INSERT INTO consumed_media VALUES(?,?,?,?)',
+                       [(u, type_, media, rng.randint(1, 100))
+                        for u in range(users)
+                        for type_ in ('anime', 'manga')
+                        for media in rng.sample(range(50_000), consumed_per_user // 2)])
+    return db
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""Latency of `.waifu <query>` on a 5k waifu collection: indexed search vs. the previous quadratic match loop.
+
+Run from the repository root: python -m benchmarks.waifu_search
+"""
+import random
+import time
+from typing import List
+
+from fuzzywuzzy import process, fuzz
+
+from benchmarks import synthetic
+from utils.database import DB, Waifu
+from utils.waifus import list_waifus, find_waifu, invalidate_waifu_index
+
+
+def legacy_find_waifu(db: DB, user_id: int, query: str) -> Waifu:
+    waifus = list_waifus(db, user_id)
+    matches = process.extract(query, (w.character.name for w in waifus), limit=None, scorer=fuzz.token_set_ratio)
+    for m in matches:
+        for i, w in enumerate(waifus):
+            if w.character.name == m[0]:
+                return waifus.pop(i)
+
+
+def mean_ms(func, queries: List[str]) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        func(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main(waifus=5_000, queries=20):
+    db = synthetic.create(characters=waifus, users=1, waifus_per_user=waifus)
+    names = [w.character.name for w in list_waifus(db, 0)]
+    rng = random.Random(0)
+    # Partial names with a typo thrown in
+    queries = [name.split()[0][:-1] + 'x' for name in rng.sample(names, queries)]
+
+    legacy = mean_ms(lambda q: legacy_find_waifu(db, 0, q), queries)
+    cold = mean_ms(lambda q: invalidate_waifu_index(0) or find_waifu(db, 0, q), queries)
+    warm = mean_ms(lambda q: find_waifu(db, 0, q), queries)
+    print(f'legacy:        {legacy:8.1f} ms per query')
+    print(f'index (cold):  {cold:8.1f} ms per query (including building the index)')
+    print(f'index (warm):  {warm:8.1f} ms per query')
+
+
+if __name__ == '__main__':
+    main()
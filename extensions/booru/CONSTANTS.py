@@ -1,11 +1,44 @@
+from pathlib import Path
+
+from .boorusources import SOURCES
+
 FILTERS = set()
 NSFW_FILTERS = {'loli', 'shota'}
+# Posts survive restarts in here
+CACHE_PATH = Path('data') / 'booru_cache.db'
+CACHE_MAX_BYTES = 64 * 2**20
+# Reactions for browsing the results
+PREVIOUS = '⬅️'
+NEXT = '➡️'
+REROLL = '🎲'
+BROWSE_TIMEOUT = 300
+# Booru responses are read in chunks of this many bytes and stop being read once this many posts are left
+STREAM_CHUNK_SIZE = 64 * 2**10
+BOARD_POST_LIMIT = 300
+# Requests that are sent to the same host at once, enough for all the subreddits of a board
+REQUESTS_PER_HOST = 8
+# Requests per second to each host (unless its boards ask for less), and how long one may take
+REQUESTS_PER_SECOND = 5
+REQUEST_TIMEOUT = 10
+# Hosts that fail this many times in a row are skipped for the cooldown (in seconds)
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN = 120
+# Searches of several boards show what arrived within this many seconds, the rest only fills the cache
+LATENCY_BUDGET = 4
+# What a search without tags turns into in SFW and NSFW channels
+DEFAULT_SFW_TAGS = frozenset({'rating:safe', '*'})
+DEFAULT_NSFW_TAGS = frozenset({'*'})
+# The most common searches are checked this often (in seconds) and fetched again this long before they expire
+PREFETCH_INTERVAL = 60
+PREFETCH_MARGIN = 180
+# Posts each channel remembers having shown, so that they aren't picked again soon
+SHOWN_PER_CHANNEL = 500
 HEADERS = {'User-Agent': "Shinobu (https://github.com/funketh/shinobu-bot)"}
 NSFW_BOARDS = {"hentai", "rule34", "nekos_nsfw_classic", "nekos_nsfw_blowjob", "nekos_nsfw_boobs",
                "nekos_nsfw_neko", "nekos_nsfw_furry", "nekos_nsfw_pussy", "nekos_nsfw_feet",
                "nekos_nsfw_yuri", "nekos_nsfw_anal", "nekos_nsfw_solo", "nekos_nsfw_cum", "nekos_nsfw_spank",
                "nekos_nsfw_cunnilingus", "nekos_nsfw_bdsm", "nekos_nsfw_piercings",
-               "nekos_nsfw_kitsune", "nekos_nsfw_holo", "nekos_nsfw_femdom", "r34"}
+               "nekos_nsfw_kitsune", "nekos_nsfw_holo", "nekos_nsfw_femdom", "r34", "e621"}
 BOARDS = {'kon', 'yan', 'nekos_nsfw_blowjob', 'nekos_nsfw_yuri', 'nekos_sfw_waifu', 'nekos_nsfw_pussy',
           'nekos_nsfw_boobs', 'r34', 'rule34', 'nekos_nsfw_anal', 'nekos_nsfw_solo', 'nekos_nsfw_cunnilingus',
           'nekos_nsfw_cum', 'nekos_nsfw_furry', 'nekos_nsfw_neko', 'nekos_nsfw_femdom', 'nekos_nsfw_feet',
@@ -13,7 +46,57 @@ BOARDS = {'kon', 'yan', 'nekos_nsfw_blowjob', 'nekos_nsfw_yuri', 'nekos_sfw_waif
           'nekos_nsfw_spank', 'nekos_sfw_smug', 'nekos_nsfw_piercings', 'dan', 'gel', 'nekos_nsfw_bdsm', 'safe',
           'nekos_nsfw_classic', 'nekos_sfw_neko'}
 
+# Boards that actually search by tags, every other board always shows the same category of images
+TAG_BOARDS = {name for name, board in SOURCES.items() if board.tagged}
+# Which category boards show images that fit a tag
+CATEGORY_TAGS = {
+    'neko': {'nekos_nsfw_neko', 'nekos_sfw_neko'},
+    'cat_ears': {'nekos_nsfw_neko', 'nekos_sfw_neko'},
+    'cat_girl': {'nekos_nsfw_neko', 'nekos_sfw_neko'},
+    'nekomimi': {'nekos_nsfw_neko', 'nekos_sfw_neko'},
+    'kitsune': {'nekos_nsfw_kitsune', 'nekos_sfw_kitsune'},
+    'fox_ears': {'nekos_nsfw_kitsune', 'nekos_sfw_kitsune'},
+    'fox_girl': {'nekos_nsfw_kitsune', 'nekos_sfw_kitsune'},
+    'holo': {'nekos_nsfw_holo', 'nekos_sfw_holo'},
+    'holo_(spice_and_wolf)': {'nekos_nsfw_holo', 'nekos_sfw_holo'},
+    'smug': {'nekos_sfw_smug'},
+    'waifu': {'nekos_sfw_waifu'},
+    'yuri': {'nekos_nsfw_yuri'},
+    'feet': {'nekos_nsfw_feet'},
+    'foot_focus': {'nekos_nsfw_feet'},
+    'femdom': {'nekos_nsfw_femdom'},
+    'bdsm': {'nekos_nsfw_bdsm'},
+    'anal': {'nekos_nsfw_anal'},
+    'cum': {'nekos_nsfw_cum'},
+    'pussy': {'nekos_nsfw_pussy'},
+    'blowjob': {'nekos_nsfw_blowjob'},
+    'fellatio': {'nekos_nsfw_blowjob'},
+    'spanking': {'nekos_nsfw_spank'},
+    'cunnilingus': {'nekos_nsfw_cunnilingus'},
+    'piercing': {'nekos_nsfw_piercings'},
+    'furry': {'nekos_nsfw_furry'},
+    'breasts': {'nekos_nsfw_boobs'},
+    'solo': {'nekos_nsfw_solo'},
+    'hentai': {'hentai', 'nekos_nsfw_classic'},
+    'rule_34': {'rule34'},
+}
+
+
+def tags_to_board(tags):
+    """The boards worth asking for the tags: those that search by tags and the categories that fit all of them"""
+    tags = {t.lower() for t in tags}
+    ratings = {t for t in tags if t.startswith('rating:')}
+    search_tags = tags - ratings
+    if search_tags <= {'*'}:
+        # Anything goes
+        return BOARDS.copy()
+
+    # e.g. Danbooru refuses searches for more than 2 tags (including the rating) without an account
+    boards = {b for b in TAG_BOARDS if SOURCES[b].max_tags is None or len(tags) <= SOURCES[b].max_tags}
 
-def tags_to_board(tag):
-    # TODO
-    return BOARDS.copy()
+    categories = set.intersection(*(CATEGORY_TAGS.get(t, set()) for t in search_tags))
+    if ratings and ratings <= {'rating:s', 'rating:safe'}:
+        categories -= NSFW_BOARDS
+    elif ratings:
+        categories &= NSFW_BOARDS
+    return boards | categories
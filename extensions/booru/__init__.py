@@ -3,4 +3,4 @@ from .booru import Booru
 
 
 def setup(bot: Shinobu):
-    bot.add_cog(Booru())
+    bot.add_cog(Booru(bot))
@@ -1,10 +1,14 @@
+import asyncio
 import logging
 
-import aiohttp
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from .boorualias import Boorualias
-from .boorucore import BooruCore
+from .CONSTANTS import CACHE_PATH, CACHE_MAX_BYTES, PREFETCH_INTERVAL, SHOWN_PER_CHANNEL
+from .boorucache import BooruCache, DiskCache
+from .boorurequests import SingleFlight, Outbound
+from .boorusources import SOURCES
+from .boorucore import BooruCore, RecentlyShown
 
 # Debug stuff
 log = logging.getLogger("Booru")
@@ -16,9 +20,20 @@ BaseCog = getattr(commands, "Cog", object)
 class Booru(BaseCog, BooruCore, Boorualias):
     """Show images from various sources"""
 
-    def __init__(self):
+    def __init__(self, bot):
         # Reusable stuff
-        self.session = aiohttp.ClientSession()
+        self.session = bot.session
+        self.cache = BooruCache(disk=DiskCache(CACHE_PATH, CACHE_MAX_BYTES))
+        self.flights = SingleFlight()
+        # fetch_board tasks of searches, which may outlive them
+        self.fetches = set()
+        self.outbound = Outbound(self.session, SOURCES.values())
+        self.shown = RecentlyShown(SHOWN_PER_CHANNEL)
+        self.prefetch_task.start()
+
+    @tasks.loop(seconds=PREFETCH_INTERVAL)
+    async def prefetch_task(self):
+        await self.prefetch()
 
     @commands.command()
     async def booru(self, ctx, *, tag=None):
@@ -30,6 +45,24 @@ class Booru(BaseCog, BooruCore, Boorualias):
         """Query the boorus"""
         pass
 
+    @boorus.command()
+    @commands.is_owner()
+    async def stats(self, ctx):
+        """Shows how often the cache of each board was hit and how many requests were collapsed or failed"""
+        boards = sorted(self.cache.hits.keys() | self.cache.disk_hits.keys() | self.cache.misses.keys())
+        lines = [f"{board:<24} {self.cache.hits[board]:>6} hits {self.cache.disk_hits[board]:>6} disk hits"
+                 f" {self.cache.misses[board]:>6} misses"
+                 for board in boards]
+        lines.append("")
+        lines.extend(f"{host:<24} {collapsed:>6} requests collapsed"
+                     for host, collapsed in self.flights.collapsed.items())
+        lines.append("")
+        lines.extend(f"{host:<24} {failed:>6} requests failed" + (" (skipped for now)" if breaker.is_open else "")
+                     for host, breaker in self.outbound.breakers.items()
+                     if (failed := self.outbound.failures[host]))
+        await ctx.send_paginated("\n".join([f"{len(self.cache)} searches cached in memory", *lines]),
+                                 prefix="```\n", suffix="```")
+
     @boorus.group()
     async def yan(self, ctx, *, tag=None):
         """Shows images using tags from yande.re"""
@@ -309,7 +342,18 @@ class Booru(BaseCog, BooruCore, Boorualias):
         tag = None
         await self.generic_specific_source(ctx, board, tag)
 
-    def __unload(self):
-        # Aiohttp closing plz work
-        self.session.detach()
+    def cog_unload(self):
+        # The session belongs to the bot, which closes it on shutdown
+        self.prefetch_task.cancel()
+        for task in self.fetches:
+            task.cancel()
+        self.flights.cancel()
+        # Cancelled tasks only stop at their next await, so the disk cache is closed once they're all done
+        tasks = {*self.fetches, *filter(None, [self.prefetch_task.get_task()])}
+        asyncio.ensure_future(self._close_cache(tasks))
+
+    async def _close_cache(self, tasks):
+        if tasks:
+            await asyncio.wait(tasks)
+        self.cache.close()
 
@@ -0,0 +1,159 @@
+import json
+import time
+import zlib
+from collections import OrderedDict, Counter
+
+from utils.database import AsyncDB
+from .booruposts import Post
+
+RATING_ALIASES = {"rating:s": "safe", "rating:safe": "safe",
+                  "rating:q": "questionable", "rating:questionable": "questionable",
+                  "rating:e": "explicit", "rating:explicit": "explicit"}
+
+
+def cache_key(board, tags):
+    """Same searches get the same key, no matter the order or case of their tags or how their ratings are spelled"""
+    tags = {t.lower() for t in tags}
+    rating_scope = tuple(sorted({RATING_ALIASES[t] for t in tags if t in RATING_ALIASES}))
+    return board, tuple(sorted(t for t in tags if t not in RATING_ALIASES)), rating_scope
+
+
+class DiskCache:
+    """Compressed posts in sqlite so that they survive restarts, evicted by TTL and total size"""
+
+    def __init__(self, path, max_bytes):
+        self.db = AsyncDB(path, readers=2)
+        self.max_bytes = max_bytes
+        self._created = False
+
+    @staticmethod
+    def _create(db):
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS booru_cache(board TEXT NOT NULL, tags TEXT NOT NULL, rating_scope TEXT NOT NULL,
+                                               expires REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL,
+                                               posts BLOB NOT NULL, PRIMARY KEY(board, tags, rating_scope))
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS booru_cache_by_access ON booru_cache(accessed)")
+
+    async def _ensure_created(self):
+        if not self._created:
+            await self.db.run(self._create)
+            self._created = True
+
+    @staticmethod
+    def _columns(key):
+        board, tags, rating_scope = key
+        return [board, " ".join(tags), " ".join(rating_scope)]
+
+    async def load(self, key):
+        """Return (expiry, posts) or None if the key isn't cached (anymore)"""
+        await self._ensure_created()
+
+        def load_and_touch(db):
+            now = time.time()
+            row = db.execute("SELECT rowid, expires, posts FROM booru_cache "
+                             "WHERE board=? AND tags=? AND rating_scope=? AND expires>?",
+                             [*self._columns(key), now]).fetchone()
+            if row is None:
+                return None
+            try:
+                posts = [Post.from_list(p) for p in json.loads(zlib.decompress(row["posts"]))]
+            except (TypeError, ValueError, zlib.error):
+                # Stored in an older format
+                return None
+            db.execute("UPDATE booru_cache SET accessed=? WHERE rowid=?", [now, row["rowid"]])
+            return row["expires"], posts
+
+        return await self.db.run(load_and_touch)
+
+    async def store(self, key, posts, expires):
+        await self._ensure_created()
+        posts = [p.to_list() for p in posts]
+
+        def store_and_evict(db):
+            now = time.time()
+            blob = zlib.compress(json.dumps(posts, separators=(",", ":")).encode())
+            db.execute("REPLACE INTO booru_cache VALUES(?, ?, ?, ?, ?, ?, ?)",
+                       [*self._columns(key), expires, now, len(blob), blob])
+            db.execute("DELETE FROM booru_cache WHERE expires<=?", [now])
+            # Least recently used first
+            total = db.execute("SELECT IFNULL(SUM(size), 0) FROM booru_cache").fetchone()[0]
+            for rowid, size in db.execute("SELECT rowid, size FROM booru_cache ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM booru_cache WHERE rowid=?", [rowid])
+                total -= size
+
+        await self.db.run(store_and_evict)
+
+    def close(self):
+        self.db.close()
+
+
+class BooruCache:
+    """LRU cache of the posts fetched from each board, with a TTL per board.
+
+    Misses fall through to the disk cache if there is one, which warms the memory up again after restarts."""
+
+    def __init__(self, max_entries=512, disk=None):
+        self.max_entries = max_entries
+        self.disk = disk
+        self._entries = OrderedDict()  # key -> (expiry, posts)
+        self.hits = Counter()
+        self.disk_hits = Counter()
+        self.misses = Counter()
+
+    def get(self, key):
+        """Return the posts cached in memory or raise KeyError"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            self._entries.pop(key, None)
+            raise KeyError(key)
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _set(self, key, posts, expires):
+        self._entries[key] = expires, posts
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def load(self, key):
+        """Return the cached posts or None, counting a hit or miss for the board"""
+        board = key[0]
+        try:
+            posts = self.get(key)
+            self.hits[board] += 1
+            return posts
+        except KeyError:
+            pass
+
+        if self.disk is not None and (entry := await self.disk.load(key)) is not None:
+            expires, posts = entry
+            self._set(key, posts, expires)
+            self.disk_hits[board] += 1
+            return posts
+
+        self.misses[board] += 1
+        return None
+
+    async def expiry(self, key):
+        """When the posts of the key expire or None if they aren't cached, without counting a hit or miss"""
+        entry = self._entries.get(key)
+        if entry is None and self.disk is not None and (entry := await self.disk.load(key)) is not None:
+            self._set(key, entry[1], entry[0])
+        return None if entry is None else entry[0]
+
+    async def store(self, key, posts, ttl):
+        expires = time.time() + ttl
+        self._set(key, posts, expires)
+        if self.disk is not None:
+            await self.disk.store(key, posts, expires)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
@@ -1,20 +1,25 @@
 import asyncio
+import functools
 import logging
-from random import randint
+import time
+from collections import defaultdict, OrderedDict
+from random import choice
 
-import aiohttp
 import discord
-from aiocache import cached, SimpleMemoryCache
 
 from api.expected_errors import ExpectedCommandError
-from . import boorusources
-from .CONSTANTS import FILTERS, NSFW_FILTERS, BOARDS, HEADERS, NSFW_BOARDS, tags_to_board
-
-cache = SimpleMemoryCache()
+from .boorucache import cache_key
+from .booruposts import Blocklist
+from .boorurequests import single_flight, iter_items, RequestFailed
+from .boorusources import SOURCES
+from .CONSTANTS import FILTERS, NSFW_FILTERS, BOARDS, HEADERS, NSFW_BOARDS, tags_to_board, PREVIOUS, NEXT, REROLL, \
+    BROWSE_TIMEOUT, BOARD_POST_LIMIT, LATENCY_BUDGET, DEFAULT_SFW_TAGS, DEFAULT_NSFW_TAGS, PREFETCH_MARGIN
 
 log = logging.getLogger("BooruCore")
 log.setLevel(logging.DEBUG)
 
+BLOCKLIST = Blocklist(FILTERS, NSFW_FILTERS)
+
 
 class BooruCore:
 
@@ -40,14 +45,13 @@ class BooruCore:
 
         # Fetch all the stuff!
         async with ctx.typing():
-            all_data = await asyncio.gather(*(getattr(self, f"fetch_{board}")(ctx, tag) for board in boards))
-        data = [item for board_data in all_data for item in board_data]
+            data = await self.fetch_boards(boards, tag)
 
         # Filter data without using up requests space
         data = await self.filter_posts(ctx, data)
 
         # Done sending requests, time to show it
-        await show_booru(ctx, data)
+        await show_booru(ctx, data, self.shown)
 
     async def generic_alias_booru(self, ctx, boards, tag):
 
@@ -68,14 +72,13 @@ class BooruCore:
 
         # Fetch all the stuff!
         async with ctx.typing():
-            all_data = await asyncio.gather(*(getattr(self, f"fetch_{board}")(ctx, tag) for board in boards))
-        data = [item for board_data in all_data for item in board_data]
+            data = await self.fetch_boards(boards, tag)
 
         # Filter data without using up requests space
         data = await self.filter_posts(ctx, data)
 
         # Done sending requests, time to show it
-        await show_booru(ctx, data)
+        await show_booru(ctx, data, self.shown)
 
     async def generic_specific_source(self, ctx, board, tag):
         """Shows a image board entry based on user query from a specific source"""
@@ -89,14 +92,13 @@ class BooruCore:
 
         # Image board fetcher
         async with ctx.typing():
-            # TODO: inspect this further
-            data = await getattr(self, f"fetch_{board}")(ctx, tag)
+            data = await self.fetch_boards({board}, tag)
 
         # Filter data without using up requests space
         data = await self.filter_posts(ctx, data)
 
         # Done sending requests, time to show it
-        await show_booru(ctx, data)
+        await show_booru(ctx, data, self.shown)
 
     @staticmethod
     async def filter_tags(ctx, tag):
@@ -136,786 +138,175 @@ class BooruCore:
         return tag
 
     async def filter_posts(self, ctx, data):
-        filtered_data = []
-
-        # Filter the content
-        for booru in data:
-            booru_tags = set(booru["tags"].split())
-
-            # Checks if rating is safe then if filters match with tags
-            if booru["rating"] == "s" or booru["rating"] == "safe":
-                if FILTERS & booru_tags:
-                    continue
-            # Checks if rating is explicit or questions then if nsfw fitlers match with tags
-            if booru["rating"] in "qe" or booru["rating"] == "questionable" or booru["rating"] == "explicit":
-                if NSFW_FILTERS & booru_tags:
-                    continue
-            # Checks if deleted
-            if booru.get("is_deleted"):
-                continue
-            # Checks if there is an ID because sometimes there's no ID but it's not deleted, I hate this
-            if booru.get("id") is False:
-                continue
-            # Another check for Danbooru because sometimes there's no file_url
-            if booru["provider"] == "Danbooru" and "file_url" not in booru:
-                continue
-
-            filtered_data.append(booru)
-
-        return filtered_data
-
-    async def fetch_from_nekos(self, urlstr, rating, provider):  # Handles provider data and fetcher responses
-        async with self.session.get(urlstr, headers=HEADERS) as resp:
-            try:
-                content = await resp.json(content_type=None)
-            except (ValueError, aiohttp.ContentTypeError) as ex:
-                log.debug("Pruned by exception, error below:")
-                log.debug(ex)
-                content = []
-        if not content or content == [] or content is None or (
-                type(content) is dict and "success" in content.keys() and content["success"] == False):
-            content = []
-            return content
-        else:
-            # Assign stuff to be used by booru_show
-            nekos_content = []
-            item = {}
-            for url in content["data"]["response"]["urls"]:
-                item["post_link"] = url
-                item["file_url"] = url
-                item["provider"] = provider
-                item["author"] = "N/A"
-                item["rating"] = rating
-                item["score"] = "N/A"
-                item["tags"] = "N/A"
-                nekos_content.append(item)
-                item = {}
-        return nekos_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_classic")
-    async def fetch_nekos_nsfw_classic(self, ctx, tag):  # Nekos nsfw classic fetcher
-        life = boorusources.nekos_nsfw_classic
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_blowjob")
-    async def fetch_nekos_nsfw_blowjob(self, ctx, tag):  # Nekos nsfw blowjob fetcher
-        life = boorusources.nekos_nsfw_blowjob
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_boobs")
-    async def fetch_nekos_nsfw_boobs(self, ctx, tag):  # Nekos nsfw boobs fetcher
-        life = boorusources.nekos_nsfw_boobs
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_neko")
-    async def fetch_nekos_nsfw_neko(self, ctx, tag):  # Nekos nsfw neko fetcher
-        life = boorusources.nekos_nsfw_neko
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_furry")
-    async def fetch_nekos_nsfw_furry(self, ctx, tag):  # Nekos nsfw furry fetcher
-        life = boorusources.nekos_nsfw_furry
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_pussy")
-    async def fetch_nekos_nsfw_pussy(self, ctx, tag):  # Nekos nsfw pussy fetcher
-        life = boorusources.nekos_nsfw_pussy
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_feet")
-    async def fetch_nekos_nsfw_feet(self, ctx, tag):  # Nekos nsfw feet fetcher
-        life = boorusources.nekos_nsfw_feet
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_yuri")
-    async def fetch_nekos_nsfw_yuri(self, ctx, tag):  # Nekos nsfw yuri fetcher
-        life = boorusources.nekos_nsfw_yuri
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_anal")
-    async def fetch_nekos_nsfw_anal(self, ctx, tag):  # Nekos nsfw anal fetcher
-        life = boorusources.nekos_nsfw_anal
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_solo")
-    async def fetch_nekos_nsfw_solo(self, ctx, tag):  # Nekos nsfw solo fetcher
-        life = boorusources.nekos_nsfw_solo
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_cum")
-    async def fetch_nekos_nsfw_cum(self, ctx, tag):  # Nekos nsfw cum fetcher
-        life = boorusources.nekos_nsfw_cum
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_spank")
-    async def fetch_nekos_nsfw_spank(self, ctx, tag):  # Nekos nsfw spank fetcher
-        life = boorusources.nekos_nsfw_spank
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_cunnilingus")
-    async def fetch_nekos_nsfw_cunnilingus(self, ctx, tag):  # Nekos nsfw cunnilingus fetcher
-        life = boorusources.nekos_nsfw_cunnilingus
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_bdsm")
-    async def fetch_nekos_nsfw_bdsm(self, ctx, tag):  # Nekos nsfw bdsm fetcher
-        life = boorusources.nekos_nsfw_bdsm
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_piercings")
-    async def fetch_nekos_nsfw_piercings(self, ctx, tag):  # Nekos nsfw piercings fetcher
-        life = boorusources.nekos_nsfw_piercings
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_kitsune")
-    async def fetch_nekos_nsfw_kitsune(self, ctx, tag):  # Nekos nsfw kitsune fetcher
-        life = boorusources.nekos_nsfw_kitsune
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_holo")
-    async def fetch_nekos_nsfw_holo(self, ctx, tag):  # Nekos nsfw holo fetcher
-        life = boorusources.nekos_nsfw_holo
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_nsfw_femdom")
-    async def fetch_nekos_nsfw_femdom(self, ctx, tag):  # Nekos nsfw femdom fetcher
-        life = boorusources.nekos_nsfw_femdom
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "explicit", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_sfw_neko")
-    async def fetch_nekos_sfw_neko(self, ctx, tag):  # Nekos sfw neko fetcher
-        life = boorusources.nekos_sfw_neko
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "safe", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_sfw_waifu")
-    async def fetch_nekos_sfw_waifu(self, ctx, tag):  # Nekos sfw waifu fetcher
-        life = boorusources.nekos_sfw_waifu
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "safe", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_sfw_kitsune")
-    async def fetch_nekos_sfw_kitsune(self, ctx, tag):  # Nekos sfw kitsune fetcher
-        life = boorusources.nekos_sfw_kitsune
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "safe", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_sfw_smug")
-    async def fetch_nekos_sfw_smug(self, ctx, tag):  # Nekos sfw smug fetcher
-        life = boorusources.nekos_sfw_smug
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "safe", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="nekos_sfw_holo")
-    async def fetch_nekos_sfw_holo(self, ctx, tag):  # Nekos sfw holo fetcher
-        life = boorusources.nekos_sfw_holo
-        all_content = []
-        for nekos in life:
-            urlstr = "https://api.nekos.dev/api/v3/" + nekos + "/?count=20"
-            log.debug(urlstr)
-            content = await self.fetch_from_nekos(urlstr, "safe", "Nekos.life")
-            all_content.extend(content)
-        return all_content
-
-    async def fetch_from_o(self, urlstr, rating, provider):  # Handles provider data and fetcher responses
-        content = ""
-
-        async with self.session.get(urlstr, headers={
-            'User-Agent': "Booru (https://github.com/Jintaku/Jintaku-Cogs-V3)"}) as resp:
-            try:
-                content = await resp.json(content_type=None)
-            except (ValueError, aiohttp.ContentTypeError) as ex:
-                log.debug("Pruned by exception, error below:")
-                log.debug(ex)
-                content = []
-        if not content or content == [] or content is None or (
-                type(content) is dict and "success" in content.keys() and content["success"] == False):
-            content = []
-            return content
-        else:
-            # Assign stuff to be used by booru_show
-            for item in content:
-                if provider == "Oboobs":
-                    item["post_link"] = "http://media.oboobs.ru/" + item["preview"]
-                    item["file_url"] = "http://media.oboobs.ru/" + item["preview"]
-                elif provider == "Obutts":
-                    item["post_link"] = "http://media.obutts.ru/" + item["preview"]
-                    item["file_url"] = "http://media.obutts.ru/" + item["preview"]
-                item["provider"] = provider
-                item["author"] = "N/A"
-                item["rating"] = rating
-                item["score"] = "N/A"
-                item["tags"] = "N/A"
-        return content
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="oboobs")
-    async def fetch_oboobs(self, ctx, tag):  # oboobs fetcher
-        urlstr = boorusources.oboobs
-        log.debug(urlstr)
-        return await self.fetch_from_o(urlstr, "explicit", "Oboobs")
-
-    @cached(ttl=600, cache=SimpleMemoryCache, key="obutts")
-    async def fetch_obutts(self, ctx, tag):  # obutts fetcher
-        urlstr = boorusources.obutts
-        log.debug(urlstr)
-        return await self.fetch_from_o(urlstr, "explicit", "Obutts")
-
-    async def fetch_from_reddit(self, urlstr, rating, provider):
-        # Handles provider data and fetcher responses
-
-        async with self.session.get(urlstr, headers=HEADERS) as resp:
-            try:
-                content = await resp.json(content_type=None)
-            except (ValueError, aiohttp.ContentTypeError) as ex:
-                log.debug("Pruned by exception, error below:")
-                log.debug(ex)
-                content = []
-        if not content or content == [] or content is None or (type(content) is dict and "error" in content.keys()):
-            content = []
-            return content
-        else:
-            # Clean up to kill bad pictures and crap
-            good_content = []
-            for item in content["data"]["children"]:
-                IMGUR_LINKS = "https://imgur.com/", "https://i.imgur.com/", "http://i.imgur.com/", "http://imgur.com", "https://m.imgur.com"
-                GOOD_EXTENSIONS = ".png", ".jpg", ".jpeg", ".gif"
-                url = item["data"]["url"]
-                if url.startswith(IMGUR_LINKS):
-                    if url.endswith(".mp4"):
-                        item["file_url"] = url[:-3] + "gif"
-                    elif url.endswith(".gifv"):
-                        item["file_url"] = url[:-1]
-                    elif url.endswith(GOOD_EXTENSIONS):
-                        item["file_url"] = url
-                    else:
-                        item["file_url"] = url + ".png"
-                elif url.startswith("https://gfycat.com/"):
-                    url_cut = url[19:]
-                    if url_cut.islower():
-                        continue
-                    item["file_url"] = "https://thumbs.gfycat.com/" + url_cut + "-size_restricted.gif"
-                elif url.endswith(GOOD_EXTENSIONS):
-                    item["file_url"] = url
-                else:
-                    continue
-                good_content.append(item)
-            content = good_content
-
-            # Assign stuff to be used by booru_show
-            for item in content:
-                item["provider"] = provider
-                item["rating"] = rating
-                item["post_link"] = "https://reddit.com" + item["data"]["permalink"]
-                item["score"] = item["data"]["score"]
-                item["tags"] = item["data"]["title"]
-                item["author"] = item["data"]["author"]
-        return content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="4k")
-    async def fetch_4k(self, ctx, tag):  # 4k fetcher
-        subreddits = boorusources.fourk
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="ahegao")
-    async def fetch_ahegao(self, ctx, tag):  # ahegao fetcher
-        subreddits = boorusources.ahegao
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="ass")
-    async def fetch_ass(self, ctx, tag):  # ass fetcher
-        subreddits = boorusources.ass
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="anal")
-    async def fetch_anal(self, ctx, tag):  # anal fetcher
-        subreddits = boorusources.anal
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="bdsm")
-    async def fetch_bdsm(self, ctx, tag):  # bdsm fetcher
-        subreddits = boorusources.bdsm
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="blowjob")
-    async def fetch_blowjob(self, ctx, tag):  # blowjob fetcher
-        subreddits = boorusources.blowjob
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="boobs")
-    async def fetch_boobs(self, ctx, tag):  # boobs fetcher
-        subreddits = boorusources.boobs
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="cunnilingus")
-    async def fetch_cunnilingus(self, ctx, tag):  # cunnilingus fetcher
-        subreddits = boorusources.cunnilingus
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="bottomless")
-    async def fetch_bottomless(self, ctx, tag):  # bottomless fetcher
-        subreddits = boorusources.bottomless
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="cumshots")
-    async def fetch_cumshots(self, ctx, tag):  # cumshots fetcher
-        subreddits = boorusources.cumshots
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="deepthroat")
-    async def fetch_deepthroat(self, ctx, tag):  # deepthroat fetcher
-        subreddits = boorusources.deepthroat
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="dick")
-    async def fetch_dick(self, ctx, tag):  # dick fetcher
-        subreddits = boorusources.dick
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="doublepenetration")
-    async def fetch_double_penetration(self, ctx, tag):  # double penetration fetcher
-        subreddits = boorusources.doublepenetration
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="gay")
-    async def fetch_gay(self, ctx, tag):  # gay fetcher
-        subreddits = boorusources.gay
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="group")
-    async def fetch_group(self, ctx, tag):  # group fetcher
-        subreddits = boorusources.group
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="hentai")
-    async def fetch_hentai(self, ctx, tag):  # hentai fetcher
-        subreddits = boorusources.hentai
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="lesbian")
-    async def fetch_lesbian(self, ctx, tag):  # lesbian fetcher
-        subreddits = boorusources.lesbian
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="milf")
-    async def fetch_milf(self, ctx, tag):  # milf fetcher
-        subreddits = boorusources.milf
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="public")
-    async def fetch_public(self, ctx, tag):  # public fetcher
-        subreddits = boorusources.public
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="rule34")
-    async def fetch_rule34(self, ctx, tag):  # rule34 fetcher
-        subreddits = boorusources.rule34
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="thigh")
-    async def fetch_thigh(self, ctx, tag):  # thigh fetcher
-        subreddits = boorusources.thigh
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="wild")
-    async def fetch_wild(self, ctx, tag):  # wild fetcher
-        subreddits = boorusources.wild
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache, key="redhead")
-    async def fetch_redhead(self, ctx, tag):  # redhead fetcher
-        subreddits = boorusources.redhead
-        all_content = []
-        for subreddit in subreddits:
-            urlstr = "https://reddit.com/r/" + subreddit + "/new.json?limit=100"
-            log.debug(urlstr)
-            content = await self.fetch_from_reddit(urlstr, "explicit", "Reddit")
-            all_content.extend(content)
-        return all_content
-
-    async def fetch_from_booru(self, urlstr, provider):
-
-        async with self.session.get(urlstr, headers=HEADERS) as resp:
-            try:
-                content = await resp.json(content_type=None)
-                if provider == "e621":
-                    content = content["posts"]
-                    log.debug(content)
-            except (ValueError, aiohttp.ContentTypeError) as ex:
-                log.debug("Pruned by exception, error below:")
-                log.debug(ex)
-                content = []
-        if not content or (isinstance(content, dict) and not content.get('success')):
+        return BLOCKLIST.filter(data)
+
+    async def prefetch(self):
+        """Refreshes the posts of the most common searches before they expire, so that those never wait on a board:
+        searches without tags and every board that always shows the same category"""
+        searches = {}
+        for tags, sfw in (DEFAULT_SFW_TAGS, True), (DEFAULT_NSFW_TAGS, False):
+            boards = tags_to_board(tags)
+            if sfw:
+                boards -= NSFW_BOARDS
+            for board in boards:
+                searches[cache_key(board, tags if SOURCES[board].tagged else ())] = board, tags
+        for name, board in SOURCES.items():
+            if not board.tagged:
+                searches.setdefault(cache_key(name, ()), (name, frozenset()))
+
+        stale = []
+        deadline = time.time() + PREFETCH_MARGIN
+        for key, search in searches.items():
+            expires = await self.cache.expiry(key)
+            if expires is None or expires < deadline:
+                stale.append(search)
+        if stale:
+            log.debug(f"Prefetching {len(stale)} searches")
+            results = await asyncio.gather(*(self.fetch_board(board, tags, refresh=True) for board, tags in stale),
+                                           return_exceptions=True)
+            for (board, tags), result in zip(stale, results):
+                if isinstance(result, Exception):
+                    log.warning(f"Prefetching {board} for {tags} failed: {result!r}")
+
+    async def fetch_boards(self, boards, tags):
+        """The posts of the boards that arrived within the latency budget.
+
+        Slower boards keep going in the background and only fill the cache, unless nothing arrived in time."""
+        tasks = []
+        for board in boards:
+            task = asyncio.ensure_future(self.fetch_board(board, tags))
+            # Also retrieves the exceptions of the tasks that are left running, which nobody awaits
+            task.add_done_callback(functools.partial(_log_failure, board, tags))
+            # Those are cancelled when the cog is unloaded
+            self.fetches.add(task)
+            task.add_done_callback(self.fetches.discard)
+            tasks.append(task)
+        done, pending = await asyncio.wait(tasks, timeout=LATENCY_BUDGET)
+        while pending and not any(_posts_of(task) for task in done):
+            more, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            done |= more
+        if pending:
+            log.info(f"Showing posts without {len(pending)} boards that took longer than {LATENCY_BUDGET}s")
+        return [post for task in done for post in _posts_of(task)]
+
+    async def fetch_board(self, name, tags, refresh=False):
+        """The posts of a board for the tags, from the cache if they've been fetched recently (unless refreshing)"""
+        board = SOURCES[name]
+        if board.max_tags is not None and len(tags) > board.max_tags:
             return []
-        else:
-            new_content = []
-            for item in content:
-                if not item.get('id'):
-                    # some items don't have ids and I can't find them anywhere (this happened on Danbooru). Weird...
-                    continue
-                if provider == "Konachan":
-                    item["post_link"] = "https://konachan.com/post/show/" + str(item["id"])
-                elif provider == "Gelbooru":
-                    item["post_link"] = "https://gelbooru.com/index.php?page=post&s=view&id=" + str(item["id"])
-                    item["author"] = item["owner"]
-                elif provider == "Rule34":
-                    item["post_link"] = "https://rule34.xxx/index.php?page=post&s=view&id=" + str(item["id"])
-                    item["file_url"] = "https://us.rule34.xxx//images/" + item["directory"] + "/" + item["image"]
-                    item["author"] = item["owner"]
-                elif provider == "Yandere":
-                    item["post_link"] = "https://yande.re/post/show/" + str(item["id"])
-                elif provider == "Danbooru":
-                    item["post_link"] = "https://danbooru.donmai.us/posts/" + str(item["id"])
-                    item["tags"] = item["tag_string"]
-                    item["author"] = "Not Available"
-                elif provider == "Safebooru":
-                    item["post_link"] = "https://safebooru.com/index.php?page=post&s=view&id=" + str(item["id"])
-                    item["file_url"] = "https://safebooru.org//images/" + item["directory"] + "/" + item["image"]
-                    item["author"] = item["owner"]
-                elif provider == "e621":
-                    item["post_link"] = "https://e621.net/post/show/" + str(item["id"])
-                    item["file_url"] = item["file"]["url"]
-                    item["author"] = "Not Available"
-                    item["tags"] = " ".join(item["tags"]["general"]
-                                            + item["tags"]["species"]
-                                            + item["tags"]["character"]
-                                            + item["tags"]["copyright"])
-                    item["score"] = item["score"]["total"]
-                item["provider"] = provider
-                new_content.append(item)
-            return new_content
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_yan(self, ctx, tags):  # Yande.re fetcher
-        urlstr = boorusources.yan + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Yandere")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_gel(self, ctx, tags):  # Gelbooru fetcher
-        urlstr = boorusources.gel + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Gelbooru")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_safe(self, ctx, tags):  # Safebooru fetcher
-        urlstr = boorusources.safe + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Safebooru")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_kon(self, ctx, tags):  # Konachan fetcher
-        urlstr = boorusources.kon + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Konachan")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_dan(self, ctx, tags):  # Danbooru fetcher
-        if len(tags) > 2:
-            return []
-        urlstr = boorusources.dan + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Danbooru")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_r34(self, ctx, tags):  # Rule34 fetcher
-        urlstr = boorusources.r34 + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "Rule34")
-
-    @cached(ttl=3600, cache=SimpleMemoryCache)
-    async def fetch_e621(self, ctx, tags):  # e621 fetcher
-        urlstr = boorusources.e621 + "+".join(tags)
-        log.debug(urlstr)
-        return await self.fetch_from_booru(urlstr, "e621")
-
-
-async def show_booru(ctx, data):  # Shows various info in embed
+        # Boards that ignore the tags are cached under no tags at all
+        key = cache_key(name, tags if board.tagged else ())
+        posts = None if refresh else await self.cache.load(key)
+        if posts is None:
+            posts, complete = await self.fetch_many(board, board.urls_for(tags))
+            # Failed requests mustn't keep the board empty for the whole TTL
+            if complete:
+                await self.cache.store(key, posts, board.ttl)
+        return posts
+
+    async def fetch_many(self, board, urls):
+        """Fetches all the URLs of a board at once (each of them only once) and merges the posts as they arrive.
+
+        Returns the posts and whether none of the requests failed."""
+        log.debug(urls)
+        posts = []
+        complete = True
+        for done in asyncio.as_completed([self.fetch_posts(url, board) for url in dict.fromkeys(urls)]):
+            try:
+                posts.extend(await done)
+            except RequestFailed as ex:
+                log.info(ex)
+                complete = False
+        return posts, complete
+
+    @single_flight
+    async def fetch_posts(self, urlstr, board):
+        # Posts are parsed while the response is still arriving and the rest is skipped once there are enough
+        posts = []
+        async with self.outbound.get(urlstr, headers=HEADERS) as resp:
+            async for item in iter_items(resp, board.shape):
+                post = board.parse(item)
+                if post is not None and BLOCKLIST.allows(post):
+                    posts.append(post)
+                    if len(posts) >= BOARD_POST_LIMIT:
+                        break
+        return posts
+
+
+def _log_failure(board, tags, task):
+    if not task.cancelled() and (ex := task.exception()) is not None:
+        log.warning(f"Fetching {board} for {tags} failed: {ex!r}")
+
+
+def _posts_of(task):
+    """The posts of a finished fetch_board task, none if it failed (one board mustn't fail the whole search)"""
+    if task.cancelled() or task.exception() is not None:
+        return []
+    return task.result()
+
+
+# Colour of the embeds of each provider
+PROVIDER_COLOURS = {"Gelbooru": 3395583, "Danbooru": 3395583, "Konachan": 8745592, "Yandere": 2236962,
+                    "Rule34": 339933, "Safebooru": 000000, "e621": 000000, "Reddit": 000000, "Oboobs": 000000,
+                    "Obutts": 000000, "Nekos.life": 000000}
+
+
+def booru_embed(booru):
+    embed = discord.Embed(color=PROVIDER_COLOURS[booru.provider])
+    embed.title = booru.source + " entry by " + booru.author
+    embed.url = booru.post_link
+    embed.set_image(url=booru.file_url)
+    return embed
+
+
+class RecentlyShown:
+    """The posts last shown in each channel, so that random picks avoid them for a while"""
+
+    def __init__(self, per_channel):
+        self.per_channel = per_channel
+        self._shown = defaultdict(OrderedDict)  # channel id -> post links, oldest first
+
+    def add(self, channel_id, post):
+        shown = self._shown[channel_id]
+        shown[post.post_link] = None
+        shown.move_to_end(post.post_link)
+        if len(shown) > self.per_channel:
+            shown.popitem(last=False)
+
+    def pick(self, channel_id, posts):
+        """The index of a random post, one that wasn't shown recently if there are any"""
+        shown = self._shown.get(channel_id, ())
+        fresh = [i for i, post in enumerate(posts) if post.post_link not in shown]
+        return choice(fresh or range(len(posts)))
+
+
+async def show_booru(ctx, data, shown):  # Shows a random post and lets the author browse the others
     if len(data) == 0:
         await ctx.send("No results.")
-    else:
+        return
 
-        i = randint(0, len(data) - 1)
+    channel_id = ctx.channel.id
+    i = shown.pick(channel_id, data)
+    shown.add(channel_id, data[i])
+    # Only the post that is shown gets an embed
+    msg = await ctx.send(embed=booru_embed(data[i]))
+    if len(data) == 1:
+        return
 
-        # Build Embed
-        embeds = []
+    async def show(new_i):
+        nonlocal i
+        i = new_i % len(data)
+        shown.add(channel_id, data[i])
+        await msg.edit(embed=booru_embed(data[i]))
 
-        for page_num, booru in enumerate(data, 1):
+    async def previous(**_):
+        await show(i - 1)
 
-            # Set colour for each board
-            color = {"Gelbooru": 3395583, "Danbooru": 3395583, "Konachan": 8745592, "Yandere": 2236962,
-                     "Rule34": 339933, "Safebooru": 000000, "e621": 000000, "Reddit": 000000, "Oboobs": 000000,
-                     "Obutts": 000000, "Nekos.life": 000000}
+    async def next_(**_):
+        await show(i + 1)
 
-            if (provider := booru['provider']) == "Reddit":
-                provider = booru['data']['subreddit_name_prefixed']
-            embed = discord.Embed(color=color[booru["provider"]])
-            embed.title = provider + " entry by " + booru["author"]
-            embed.url = booru["post_link"]
-            embed.set_image(url=booru["file_url"])
-            embeds.append(embed)
-        try:
-            await ctx.send(embed=embeds[i + 1])
-        except Exception:
-            log.debug(data[i])
-            raise
+    async def reroll(**_):
+        await show(shown.pick(channel_id, data))
 
+    # The results are released once nobody reacts anymore
+    await ctx.reaction_buttons(msg, {PREVIOUS: previous, NEXT: next_, REROLL: reroll}, timeout=BROWSE_TIMEOUT)
@@ -0,0 +1,182 @@
+import sys
+from enum import Enum
+from typing import NamedTuple, Optional, Union
+
+IMGUR_LINKS = "https://imgur.com/", "https://i.imgur.com/", "http://i.imgur.com/", "http://imgur.com", "https://m.imgur.com"
+GOOD_EXTENSIONS = ".png", ".jpg", ".jpeg", ".gif"
+
+
+class Rating(Enum):
+    SAFE = "safe"
+    QUESTIONABLE = "questionable"
+    EXPLICIT = "explicit"
+    # e.g. Danbooru's "general" and "sensitive"
+    UNKNOWN = "unknown"
+
+
+# The ratings of providers and posts, however they're spelled
+_RATINGS = {"s": Rating.SAFE, "safe": Rating.SAFE,
+            "q": Rating.QUESTIONABLE, "questionable": Rating.QUESTIONABLE,
+            "e": Rating.EXPLICIT, "explicit": Rating.EXPLICIT,
+            **{rating: rating for rating in Rating}}
+
+
+class Blocklist:
+    """Tags that get posts of a rating filtered out, compiled once instead of checked per post and rating"""
+
+    def __init__(self, safe_tags, nsfw_tags):
+        safe_tags = frozenset(map(sys.intern, safe_tags))
+        nsfw_tags = frozenset(map(sys.intern, nsfw_tags))
+        self._blocked = {Rating.SAFE: safe_tags, Rating.QUESTIONABLE: nsfw_tags, Rating.EXPLICIT: nsfw_tags,
+                         Rating.UNKNOWN: frozenset()}
+
+    def allows(self, post):
+        return self._blocked[post.rating].isdisjoint(post.tags)
+
+    def filter(self, posts):
+        blocked = self._blocked
+        return [p for p in posts if blocked[p.rating].isdisjoint(p.tags)]
+
+
+class Post:
+    """The parts of a post that are shown or filtered by, instead of the whole provider JSON"""
+
+    __slots__ = "provider", "source", "post_link", "file_url", "author", "rating", "score", "tags"
+
+    def __init__(self, provider, post_link, file_url, author, rating, score, tags, source=None):
+        # Repeated across all posts, so they're interned. Interned tags hash and compare like ids when filtering
+        self.provider = sys.intern(provider)
+        # Where the post was found, e.g. the subreddit
+        self.source = sys.intern(source) if source else self.provider
+        self.post_link = post_link
+        self.file_url = file_url
+        self.author = author
+        self.rating = _RATINGS.get(rating, Rating.UNKNOWN)
+        self.score = score
+        self.tags = frozenset(map(sys.intern, tags))
+
+    def to_list(self):
+        return [self.provider, self.post_link, self.file_url, self.author, self.rating.value, self.score, list(self.tags),
+                self.source]
+
+    @classmethod
+    def from_list(cls, fields):
+        return cls(*fields)
+
+
+class BooruFields(NamedTuple):
+    """Where the parts of a Post are in an item of a booru's response.
+
+    Each one is a key, a path of keys like "file.url" or a template like "https://yande.re/post/show/{id}".
+    The tags may also be several paths to lists of tags (e621 groups its tags by type).
+    Missing authors are "Not Available"."""
+    post_link: str
+    file_url: str = "file_url"
+    tags: Union[str, tuple] = "tags"
+    author: Optional[str] = None
+    score: str = "score"
+
+
+def _getter(field):
+    """A function that gets a field (as in BooruFields) from an item or None"""
+    if field is None:
+        return lambda item: None
+    if "{" in field:
+        prefix, _, rest = field.partition("{")
+        key, _, suffix = rest.partition("}")
+        if not suffix:
+            # Most are a link ending with the id
+            def concat_field(item):
+                try:
+                    return prefix + str(item[key])
+                except KeyError:
+                    return None
+
+            return concat_field
+
+        def format_field(item):
+            try:
+                return field.format_map(item)
+            except KeyError:
+                return None
+
+        return format_field
+    keys = field.split(".")
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda item: item.get(key)
+
+    def get_path(item):
+        for k in keys:
+            item = item.get(k) if isinstance(item, dict) else None
+        return item
+
+    return get_path
+
+
+def compile_booru(provider, fields):
+    """The parse function of a booru: an item of its response -> its Post or None if it can't be shown"""
+    post_link, file_url, author, score = map(_getter, (fields.post_link, fields.file_url, fields.author, fields.score))
+    if isinstance(fields.tags, tuple):
+        groups = [_getter(group) for group in fields.tags]
+
+        def tags(item):
+            return [t for group in groups for t in group(item) or ()]
+    else:
+        tag_string = _getter(fields.tags)
+
+        def tags(item):
+            return (tag_string(item) or "").split()
+
+    def parse(item):
+        if not isinstance(item, dict) or not item.get("id") or item.get("is_deleted"):
+            # some items don't have ids and I can't find them anywhere (this happened on Danbooru). Weird...
+            return None
+        url = file_url(item)
+        if not url:
+            # Sometimes there's no file_url (on Danbooru and e621)
+            return None
+        return Post(provider, post_link(item), url, author(item) or "Not Available", item.get("rating"), score(item),
+                    tags(item))
+
+    return parse
+
+
+def reddit_file_url(url):
+    """A link to the image of a reddit post or None if it doesn't have one"""
+    if url.startswith(IMGUR_LINKS):
+        if url.endswith(".mp4"):
+            return url[:-3] + "gif"
+        elif url.endswith(".gifv"):
+            return url[:-1]
+        elif url.endswith(GOOD_EXTENSIONS):
+            return url
+        else:
+            return url + ".png"
+    elif url.startswith("https://gfycat.com/"):
+        url_cut = url[19:]
+        if url_cut.islower():
+            return None
+        return "https://thumbs.gfycat.com/" + url_cut + "-size_restricted.gif"
+    elif url.endswith(GOOD_EXTENSIONS):
+        return url
+    return None
+
+
+def compile_reddit(provider, rating):
+    def parse(child):
+        data = child["data"]
+        # Clean up to kill bad pictures and crap
+        if file_url := reddit_file_url(data["url"]):
+            return Post(provider, "https://reddit.com" + data["permalink"], file_url, data["author"], rating,
+                        data["score"], data["title"].split(), source=data["subreddit_name_prefixed"])
+        return None
+
+    return parse
+
+
+def compile_nekos(provider, rating):
+    def parse(url):
+        return Post(provider, url, url, "N/A", rating, "N/A", ())
+
+    return parse
@@ -0,0 +1,272 @@
+import asyncio
+import codecs
+import contextlib
+import functools
+import json
+import logging
+import re
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .CONSTANTS import STREAM_CHUNK_SIZE, REQUESTS_PER_HOST, REQUESTS_PER_SECOND, REQUEST_TIMEOUT, \
+    BREAKER_FAILURES, BREAKER_COOLDOWN
+
+log = logging.getLogger("BooruRequests")
+
+
+class SingleFlight:
+    """Concurrent requests for the same URL share one request and its result"""
+
+    def __init__(self):
+        self._in_flight = {}
+        self.collapsed = Counter()  # host -> requests that didn't have to be sent
+
+    async def do(self, url, fetch):
+        task = self._in_flight.get(url)
+        if task is None:
+            task = self._in_flight[url] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        else:
+            self.collapsed[urlsplit(url).hostname] += 1
+        # Cancelling one of the callers mustn't cancel the request for all the others
+        return await asyncio.shield(task)
+
+    def cancel(self):
+        for task in self._in_flight.values():
+            task.cancel()
+
+
+class HostLimits:
+    """Caps how many requests are sent to each host at once"""
+
+    def __init__(self, per_host, overrides=None):
+        self.per_host = per_host
+        self.overrides = overrides or {}  # host -> requests at once
+        self._semaphores = {}
+
+    def for_host(self, host):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.overrides.get(host, self.per_host))
+        return semaphore
+
+
+class TokenBucket:
+    """Lets requests through at a steady rate, with bursts of up to `burst` requests after a quiet while"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Stops asking a host for a while after it failed too often in a row"""
+
+    def __init__(self, failures, cooldown):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._failed = 0
+        self.open_until = 0.0
+
+    @property
+    def is_open(self):
+        return time.monotonic() < self.open_until
+
+    def succeeded(self):
+        self._failed = 0
+
+    def failed(self):
+        self._failed += 1
+        if self._failed >= self.failures:
+            self.open_until = time.monotonic() + self.cooldown
+            # A single failure after the cooldown opens it again
+            self._failed = self.failures - 1
+
+
+class RequestFailed(Exception):
+    """A host couldn't be asked or didn't answer in time"""
+
+
+def _strictest(boards, attribute):
+    """host -> the strictest limit that the boards on it declare, if any of them do"""
+    limits = {}
+    for board in boards:
+        limit = getattr(board, attribute)
+        if limit is not None:
+            for url in board.urls:
+                host = urlsplit(url).hostname
+                limits[host] = min(limits.get(host, limit), limit)
+    return limits
+
+
+class Outbound:
+    """All requests of the cog go out through here: rate limited, a few at once, with a timeout and
+    a circuit breaker per host"""
+
+    def __init__(self, session, boards):
+        self.session = session
+        self.limits = HostLimits(REQUESTS_PER_HOST, _strictest(boards, "max_requests"))
+        self.rates = _strictest(boards, "rate")  # host -> requests per second
+        self.timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        self.buckets = {}
+        self.breakers = {}
+        self.failures = Counter()  # host -> failed requests
+
+    def _bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate = self.rates.get(host, REQUESTS_PER_SECOND)
+            bucket = self.buckets[host] = TokenBucket(rate, max(1, round(rate * 2)))
+        return bucket
+
+    def breaker(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        return breaker
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        """Like session.get, but raises RequestFailed if the host is failing or fails now"""
+        host = urlsplit(url).hostname
+        breaker = self.breaker(host)
+        if breaker.is_open:
+            raise RequestFailed(f"{host} is skipped after failing repeatedly")
+
+        async with self.limits.for_host(host):
+            await self._bucket(host).take()
+            try:
+                async with self.session.get(url, timeout=self.timeout, **kwargs) as resp:
+                    # Including error pages like 403s from Cloudflare, which would parse to no posts
+                    if resp.status >= 400:
+                        raise RequestFailed(f"{host} answered {resp.status}")
+                    yield resp
+            except (RequestFailed, aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                breaker.failed()
+                self.failures[host] += 1
+                if isinstance(ex, RequestFailed):
+                    raise
+                raise RequestFailed(f"{host} failed: {ex!r}") from ex
+            breaker.succeeded()
+
+
+def single_flight(fetch):
+    """Lets concurrent calls of a fetch method for the same URL share the SingleFlight of the cog"""
+
+    @functools.wraps(fetch)
+    async def wrapper(self, urlstr, *args):
+        return await self.flights.do(urlstr, lambda: fetch(self, urlstr, *args))
+
+    return wrapper
+
+
+_WHITESPACE = re.compile(r"\s*")
+# e621 wraps its posts in an object
+_WRAPPED_ARRAY = re.compile(r'\{\s*"posts"\s*:\s*\[')
+
+
+async def iter_json_array(chunks):
+    """Yields the items of the JSON array in a stream of byte chunks as soon as each one has arrived.
+
+    Only one item is decoded at a time, so a response never has to be held in memory all at once.
+    An empty response has no items. Raises ValueError for anything else that isn't an array of items
+    (or e621's {"posts": [...]}) and for arrays that end early."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    chunks = chunks.__aiter__()
+    buffer = ""
+    pos = 0
+
+    async def more():
+        nonlocal buffer, pos
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            return False
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        return True
+
+    # Find where the array starts
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            if buffer[pos] == "[":
+                pos += 1
+                break
+            if (wrapped := _WRAPPED_ARRAY.match(buffer, pos)) is not None:
+                pos = wrapped.end()
+                break
+            # Might just not have the whole opening yet
+            if buffer[pos] != "{" or len(buffer) - pos > 64:
+                raise ValueError(f"Not a JSON array: {buffer[pos:pos + 64]!r}")
+        if not await more():
+            if pos < len(buffer):
+                raise ValueError(f"Not a JSON array: {buffer[pos:pos + 64]!r}")
+            return
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if not await more():
+                raise ValueError("The JSON array ended early")
+            continue
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The rest of the item is still on its way
+            if not await more():
+                raise
+            continue
+        pos = end
+        yield item
+
+
+# Where the items are in the JSON responses of the shapes of boards that aren't streamed
+_ITEM_PATHS = {"reddit": ("data", "children"), "nekos": ("data", "response", "urls")}
+
+
+async def iter_items(resp, shape):
+    """Yields the items of a board's response. An empty response has none,
+    anything else that isn't shaped like the board's responses raises RequestFailed."""
+    host = resp.url.host
+    if shape == "booru":
+        try:
+            async for item in iter_json_array(resp.content.iter_chunked(STREAM_CHUNK_SIZE)):
+                yield item
+        except ValueError as ex:
+            raise RequestFailed(f"{host} sent a malformed response: {ex}") from ex
+        return
+
+    try:
+        content = await resp.json(content_type=None)
+    except ValueError as ex:
+        raise RequestFailed(f"{host} sent a malformed response: {ex}") from ex
+    if content is None:
+        return
+    for key in _ITEM_PATHS[shape]:
+        if not isinstance(content, dict):
+            raise RequestFailed(f"{host} sent a response without {'.'.join(_ITEM_PATHS[shape])}")
+        content = content.get(key)
+    for item in content or ():
+        yield item
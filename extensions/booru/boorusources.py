@@ -1,40 +1,119 @@
-# Reddit sources
-hentai = ["hentai", "thick_hentai", "HQHentai", "AnimeBooty", "thighdeology", "ecchigifs", "nsfwanimegifs", "oppai_gif"]
-rule34 = ["rule34", "rule34cartoons", "Rule_34", "Rule34LoL", "AvatarPorn", "Overwatch_Porn", "Rule34Overwatch",
-          "WesternHentai"]
-
-# OG Boorus sources
-dan = "https://danbooru.donmai.us/posts.json?limit=200&tags="
-e621 = "https://e621.net/posts.json?limit=320&tags="
-r34 = "https://rule34.xxx/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags="
-kon = "https://konachan.com/post.json?limit=1000&tags="
-safe = "https://safebooru.org/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags="
-gel = "https://gelbooru.com/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags="
-yan = "https://yande.re/post.json?limit=1000&tags="
-
-# Nekos.life NSFW sources
-nekos_nsfw_classic = ["images/nsfw/gif/classic", "images/nsfw/img/classic_lewd"]
-nekos_nsfw_blowjob = ["images/nsfw/gif/blow_job", "images/nsfw/img/blowjob_lewd"]
-nekos_nsfw_boobs = ["images/nsfw/img/smallboobs_lewd", "images/nsfw/gif/tits", "images/nsfw/img/tits_lewd"]
-nekos_nsfw_neko = ["images/nsfw/gif/neko", "images/nsfw/img/neko_lewd", "images/nsfw/img/neko_ero"]
-nekos_nsfw_furry = ["images/nsfw/gif/yiff", "images/nsfw/img/yiff_lewd"]
-nekos_nsfw_pussy = ["images/nsfw/gif/pussy_wank", "images/nsfw/gif/pussy", "images/nsfw/img/pussy_lewd"]
-nekos_nsfw_feet = ["images/nsfw/gif/feet", "images/nsfw/img/feet_lewd", "images/nsfw/img/feet_ero"]
-nekos_nsfw_yuri = ["images/nsfw/gif/yuri", "images/nsfw/img/yuri_lewd", "images/nsfw/img/yuri_ero"]
-nekos_nsfw_anal = ["images/nsfw/gif/anal", "images/nsfw/img/anal_lewd", "images/nsfw/img/anus_lewd"]
-nekos_nsfw_solo = ["images/nsfw/gif/girls_solo", "images/nsfw/img/solo_lewd"]
-nekos_nsfw_cum = ["images/nsfw/gif/cum", "images/nsfw/img/cum_lewd"]
-nekos_nsfw_spank = ["images/nsfw/gif/spank"]
-nekos_nsfw_cunnilingus = ["images/nsfw/gif/kuni"]
-nekos_nsfw_bdsm = ["images/nsfw/img/bdsm_lewd"]
-nekos_nsfw_piercings = ["images/nsfw/img/piersing_lewd", "images/nsfw/img/piersing_ero"]
-nekos_nsfw_kitsune = ["images/nsfw/img/kitsune_lewd", "images/nsfw/img/kitsune_ero"]
-nekos_nsfw_holo = ["images/nsfw/img/holo_lewd", "images/nsfw/img/holo_ero"]
-nekos_nsfw_femdom = ["images/nsfw/img/femdom_lewd"]
-
-# Nekos.life SFW sources
-nekos_sfw_neko = ["images/sfw/gif/neko", "images/sfw/img/neko"]
-nekos_sfw_waifu = ["images/sfw/img/waifu"]
-nekos_sfw_kitsune = ["images/sfw/img/kitsune"]
-nekos_sfw_smug = ["images/sfw/img/smug"]
-nekos_sfw_holo = ["images/sfw/img/holo"]
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from .booruposts import BooruFields, compile_booru, compile_reddit, compile_nekos
+
+
+@dataclass
+class Board:
+    """A source of posts: where to fetch them from and how to read them.
+
+    Boorus search by tags, so their URLs have a {tags} placeholder. The other boards always show the same category
+    of images and give all their posts the same rating."""
+    name: str
+    provider: str
+    urls: tuple
+    # "booru" (a JSON array of posts, streamed), "reddit" (a listing) or "nekos" (a list of image URLs)
+    shape: str
+    fields: Optional[BooruFields] = None
+    rating: Optional[str] = None
+    ttl: int = 3600
+    tagged: bool = False
+    # Searches with more tags than this (including the rating) aren't sent to the board at all
+    max_tags: Optional[int] = None
+    # Requests sent to its host at once and per second, if it needs to be asked more gently than the others
+    max_requests: Optional[int] = None
+    rate: Optional[float] = None
+    parse: Callable = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if self.shape == "booru":
+            self.parse = compile_booru(self.provider, self.fields)
+        elif self.shape == "reddit":
+            self.parse = compile_reddit(self.provider, self.rating)
+        elif self.shape == "nekos":
+            self.parse = compile_nekos(self.provider, self.rating)
+        else:
+            raise ValueError(f"Unknown shape {self.shape}")
+
+    def urls_for(self, tags):
+        if self.tagged:
+            tags = "+".join(sorted(tags))
+            return [url.format(tags=tags) for url in self.urls]
+        return list(self.urls)
+
+
+def booru(name, provider, url, fields, **kwargs):
+    return Board(name, provider, (url,), "booru", fields, tagged=True, **kwargs)
+
+
+def reddit(name, subreddits, rating="explicit"):
+    urls = tuple("https://reddit.com/r/" + subreddit + "/new.json?limit=100" for subreddit in subreddits)
+    return Board(name, "Reddit", urls, "reddit", rating=rating)
+
+
+def nekos(name, endpoints, rating):
+    urls = tuple("https://api.nekos.dev/api/v3/" + endpoint + "/?count=20" for endpoint in endpoints)
+    return Board(name, "Nekos.life", urls, "nekos", rating=rating, ttl=600)
+
+
+SOURCES = {board.name: board for board in [
+    # OG Boorus sources
+    booru("dan", "Danbooru", "https://danbooru.donmai.us/posts.json?limit=200&tags={tags}",
+          BooruFields("https://danbooru.donmai.us/posts/{id}", tags="tag_string"), max_tags=2),
+    booru("e621", "e621", "https://e621.net/posts.json?limit=320&tags={tags}",
+          BooruFields("https://e621.net/post/show/{id}", file_url="file.url", score="score.total",
+                      tags=("tags.general", "tags.species", "tags.character", "tags.copyright")),
+          max_requests=2, rate=2),
+    booru("r34", "Rule34", "https://rule34.xxx/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags={tags}",
+          BooruFields("https://rule34.xxx/index.php?page=post&s=view&id={id}",
+                      file_url="https://us.rule34.xxx//images/{directory}/{image}", author="owner")),
+    booru("kon", "Konachan", "https://konachan.com/post.json?limit=1000&tags={tags}",
+          BooruFields("https://konachan.com/post/show/{id}", author="author")),
+    booru("safe", "Safebooru", "https://safebooru.org/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags={tags}",
+          BooruFields("https://safebooru.com/index.php?page=post&s=view&id={id}",
+                      file_url="https://safebooru.org//images/{directory}/{image}", author="owner")),
+    booru("gel", "Gelbooru", "https://gelbooru.com/index.php?page=dapi&s=post&q=index&json=1&limit=1000&tags={tags}",
+          BooruFields("https://gelbooru.com/index.php?page=post&s=view&id={id}", author="owner")),
+    booru("yan", "Yandere", "https://yande.re/post.json?limit=1000&tags={tags}",
+          BooruFields("https://yande.re/post/show/{id}", author="author")),
+
+    # Reddit sources
+    reddit("hentai", ["hentai", "thick_hentai", "HQHentai", "AnimeBooty", "thighdeology", "ecchigifs",
+                      "nsfwanimegifs", "oppai_gif"]),
+    reddit("rule34", ["rule34", "rule34cartoons", "Rule_34", "Rule34LoL", "AvatarPorn", "Overwatch_Porn",
+                      "Rule34Overwatch", "WesternHentai"]),
+
+    # Nekos.life NSFW sources
+    nekos("nekos_nsfw_classic", ["images/nsfw/gif/classic", "images/nsfw/img/classic_lewd"], "explicit"),
+    nekos("nekos_nsfw_blowjob", ["images/nsfw/gif/blow_job", "images/nsfw/img/blowjob_lewd"], "explicit"),
+    nekos("nekos_nsfw_boobs", ["images/nsfw/img/smallboobs_lewd", "images/nsfw/gif/tits",
+                               "images/nsfw/img/tits_lewd"], "explicit"),
+    nekos("nekos_nsfw_neko", ["images/nsfw/gif/neko", "images/nsfw/img/neko_lewd", "images/nsfw/img/neko_ero"],
+          "explicit"),
+    nekos("nekos_nsfw_furry", ["images/nsfw/gif/yiff", "images/nsfw/img/yiff_lewd"], "explicit"),
+    nekos("nekos_nsfw_pussy", ["images/nsfw/gif/pussy_wank", "images/nsfw/gif/pussy", "images/nsfw/img/pussy_lewd"],
+          "explicit"),
+    nekos("nekos_nsfw_feet", ["images/nsfw/gif/feet", "images/nsfw/img/feet_lewd", "images/nsfw/img/feet_ero"],
+          "explicit"),
+    nekos("nekos_nsfw_yuri", ["images/nsfw/gif/yuri", "images/nsfw/img/yuri_lewd", "images/nsfw/img/yuri_ero"],
+          "explicit"),
+    nekos("nekos_nsfw_anal", ["images/nsfw/gif/anal", "images/nsfw/img/anal_lewd", "images/nsfw/img/anus_lewd"],
+          "explicit"),
+    nekos("nekos_nsfw_solo", ["images/nsfw/gif/girls_solo", "images/nsfw/img/solo_lewd"], "explicit"),
+    nekos("nekos_nsfw_cum", ["images/nsfw/gif/cum", "images/nsfw/img/cum_lewd"], "explicit"),
+    nekos("nekos_nsfw_spank", ["images/nsfw/gif/spank"], "explicit"),
+    nekos("nekos_nsfw_cunnilingus", ["images/nsfw/gif/kuni"], "explicit"),
+    nekos("nekos_nsfw_bdsm", ["images/nsfw/img/bdsm_lewd"], "explicit"),
+    nekos("nekos_nsfw_piercings", ["images/nsfw/img/piersing_lewd", "images/nsfw/img/piersing_ero"], "explicit"),
+    nekos("nekos_nsfw_kitsune", ["images/nsfw/img/kitsune_lewd", "images/nsfw/img/kitsune_ero"], "explicit"),
+    nekos("nekos_nsfw_holo", ["images/nsfw/img/holo_lewd", "images/nsfw/img/holo_ero"], "explicit"),
+    nekos("nekos_nsfw_femdom", ["images/nsfw/img/femdom_lewd"], "explicit"),
+
+    # Nekos.life SFW sources
+    nekos("nekos_sfw_neko", ["images/sfw/gif/neko", "images/sfw/img/neko"], "safe"),
+    nekos("nekos_sfw_waifu", ["images/sfw/img/waifu"], "safe"),
+    nekos("nekos_sfw_kitsune", ["images/sfw/img/kitsune"], "safe"),
+    nekos("nekos_sfw_smug", ["images/sfw/img/smug"], "safe"),
+    nekos("nekos_sfw_holo", ["images/sfw/img/holo"], "safe"),
+]}
@@ -11,12 +11,13 @@ class CallNotification(commands.Cog):
     def __init__(self):
         self.COOLDOWN_TIME = 5
         self.last_used = 0
-        self.voiceid_to_textid = {
-            row['voice_id']: row['text_id']
-            for row in database.connect().execute(
-                'SELECT voice_id, text_id FROM voice_to_text'
-            )
-        }
+        with database.pool().connection() as db:
+            self.voiceid_to_textid = {
+                row['voice_id']: row['text_id']
+                for row in db.execute(
+                    'SELECT voice_id, text_id FROM voice_to_text'
+                )
+            }
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member,
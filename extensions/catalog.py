@@ -0,0 +1,63 @@
+import logging
+from typing import Optional
+
+from discord.ext import commands, tasks
+
+from api.expected_errors import ExpectedCommandError
+from api.my_context import Context
+from api.shinobu import Shinobu
+from utils.catalog import CatalogIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 100
+
+
+class Catalog(commands.Cog):
+    def __init__(self, bot: Shinobu):
+        self.bot = bot
+        self.index: Optional[CatalogIndex] = None
+        self.refresh_task.start()
+
+    def cog_unload(self):
+        self.refresh_task.cancel()
+
+    @tasks.loop(minutes=1)
+    async def refresh_task(self):
+        await self.refresh()
+
+    async def refresh(self):
+        db = self.bot.db
+        if self.index is None:
+            # Building the whole index takes a while, so keep it off the event loop
+            self.index = await db.read(CatalogIndex.load)
+            logger.info(f'loaded {len(self.index.entries)} characters into the catalog')
+        else:
+            changes = await db.read(CatalogIndex.load_changes, self.index.last_change)
+            self.index.apply(changes)
+            if changes.entries or changes.deleted:
+                logger.info(f'updated {len(changes.entries) + len(changes.deleted)} characters of the catalog')
+        await db.execute('DELETE FROM character_change WHERE id <= ?', [self.index.last_change])
+
+    @commands.command(aliases=['c'])
+    async def catalog(self, ctx: Context, *search_terms: str):
+        """Search all characters by name and series, including the packs they can be pulled from."""
+        if not search_terms:
+            raise ExpectedCommandError('Tell me what to search for!')
+        if self.index is None:
+            raise ExpectedCommandError('The catalog is still loading, try again in a bit!')
+
+        results = self.index.search(' '.join(search_terms), limit=MAX_RESULTS)
+        if not results:
+            raise ExpectedCommandError('No character matches your search!')
+
+        lines = []
+        for entry in results:
+            rarity = self.index.rarity_names.get(entry.rarity, entry.rarity)
+            packs = ', '.join(self.index.packs(entry)) or 'no current pack'
+            lines.append(f"{entry.name} [{entry.series}] - {rarity} - {packs}")
+        await ctx.send_paginated('\n'.join(lines), prefix='```md\n', suffix='```')
+
+
+def setup(bot: Shinobu):
+    bot.add_cog(Catalog(bot))
@@ -1,5 +1,7 @@
+import asyncio
 import logging
-from collections import AsyncIterator
+import time
+from collections import AsyncIterator, defaultdict
 from datetime import datetime, timedelta
 
 import aiohttp
@@ -9,13 +11,17 @@ from discord.ext import commands, tasks
 from api.my_context import Context
 from api.shinobu import Shinobu
 from data.CONSTANTS import CURRENCY, ANNOUNCEMENT_CHANNEL_ID
-from utils import database
 from utils import mal_rss
-from utils.database import User
-from utils.mal_scraper import Manga, Anime
+from utils.database import User, DB
+from utils.mal_scraper import Manga, Anime, Content
 
 logger = logging.getLogger(__name__)
 
+BIRTHDAY_QUERY = "SELECT * FROM user WHERE birthday == DATE('now', 'localtime')"
+RECORDED_MEDIA_QUERY = 'SELECT type, id, amount FROM consumed_media WHERE user=?'
+# myanimelist.net starts refusing requests when it gets too many of them
+MAL_REQUESTS_AT_ONCE = 4
+
 
 class Economy(commands.Cog):
     def __init__(self, bot: Shinobu):
@@ -28,11 +34,11 @@ class Economy(commands.Cog):
         await self.birthday()
 
     async def birthday(self):
-        db = database.connect()
-        for user_row in User.select_many(db, "SELECT * FROM user WHERE birthday == DATE('now', 'localtime')"):
-            with db:
-                db.execute('UPDATE user SET balance=balance+100, birthday=? WHERE id=?',
-                           [add_years(user_row.birthday, 1), user_row.id])
+        db = self.bot.db
+        birthday_users = User.async_select_many(db, BIRTHDAY_QUERY)
+        async for user_row in birthday_users:
+            await db.execute('UPDATE user SET balance=balance+100, birthday=? WHERE id=?',
+                             [add_years(user_row.birthday, 1), user_row.id])
             user: discord.User = self.bot.get_user(user_row.id)
             announcement_channel: discord.TextChannel = self.bot.get_channel(ANNOUNCEMENT_CHANNEL_ID)
             await announcement_channel.send(f'🎉🎉🎉  Happy Birthday {user.mention}!  🎉🎉🎉'
@@ -44,27 +50,70 @@ class Economy(commands.Cog):
         async for _ in self.reward_media_consumption():
             pass
 
-    @staticmethod
-    async def reward_media_consumption() -> AsyncIterator[tuple[User, int]]:
+    async def reward_media_consumption(self) -> AsyncIterator[tuple[User, int]]:
         logger.debug('rewarding media consumption...')
-        db = database.connect()
-
-        async with aiohttp.ClientSession() as session:
-            for user in User.select_many(db, "SELECT * FROM user WHERE mal_username > ''"):
-                for content_type in Anime, Manga:
-                    content = await mal_rss.new_mal_content(db=db, session=session, content_type=content_type,
-                                                            user_id=user.id, mal_username=user.mal_username)
-                    with db:
-                        for series_id, old_amount, consumed_amount in content:
-                            amount = consumed_amount - old_amount
-                            reward = await content_type.from_id(series_id).calculate_reward(amount)
-                            db.execute('UPDATE user SET balance=balance+? WHERE id=?',
-                                       (reward, user.id))
-                            db.execute('REPLACE INTO consumed_media(user,type,id,amount) VALUES(?,?,?,?)',
-                                       (user.id, content_type.domain_suffix, series_id, consumed_amount))
-                            logger.info(f'user {user.id} consumed {consumed_amount - old_amount}'
-                                        f' bits of {series_id} ({content_type.domain_suffix})')
-                            yield user, reward
+        start = time.perf_counter()
+        db = self.bot.db
+        session = self.bot.session
+        # Shared by the feeds and the series pages, which all go to myanimelist.net
+        limit = asyncio.Semaphore(MAL_REQUESTS_AT_ONCE)
+        users = [user async for user in User.async_select_many(db, "SELECT * FROM user WHERE mal_username > ''")]
+        feeds = [(user, content_type) for user in users for content_type in (Anime, Manga)]
+
+        async def new_content(user: User, content_type: type[Content]) -> list[tuple[int, int, int]]:
+            try:
+                entries = await mal_rss.fetch_mal_entries(session, content_type, user.mal_username, limit)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                # Nothing is recorded, so it's rewarded by the next sweep
+                logger.warning(f"couldn't fetch the {content_type.domain_suffix} feeds of user {user.id}: {ex!r}")
+                return []
+            return list(await mal_rss.new_mal_content(db, entries, content_type, user.id))
+
+        contents = await asyncio.gather(*(new_content(user, content_type) for user, content_type in feeds))
+
+        # Each series is scraped once, no matter how many users consumed it
+        scrapers = {(content_type, series_id): content_type.from_id(series_id, session)
+                    for (_, content_type), content in zip(feeds, contents) for series_id, _, _ in content}
+
+        async def scrape(scraper: Content):
+            async with limit:
+                # Only fetches the page if the content type needs it for the reward and it isn't known yet
+                await self.bot.series_metadata.fill(scraper, type(scraper).reward_fields)
+
+        results = await asyncio.gather(*(scrape(scraper) for scraper in scrapers.values()), return_exceptions=True)
+        failed = set()
+        for (content_type, series_id), result in zip(scrapers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"couldn't scrape {series_id} ({content_type.domain_suffix}): {result!r}")
+                failed.add((content_type, series_id))
+
+        rewards_by_user: dict[int, list[tuple[type[Content], int, int, int, int]]] = defaultdict(list)
+        for (user, content_type), content in zip(feeds, contents):
+            for series_id, old_amount, consumed_amount in content:
+                if (content_type, series_id) in failed:
+                    continue
+                try:
+                    reward = await scrapers[content_type, series_id].calculate_reward(consumed_amount - old_amount)
+                except Exception as ex:
+                    # e.g. the page doesn't say how long the episodes are
+                    logger.warning(f"couldn't calculate the reward for {series_id} ({content_type.domain_suffix}):"
+                                   f" {ex!r}")
+                    failed.add((content_type, series_id))
+                    continue
+                rewards_by_user[user.id].append((content_type, series_id, old_amount, consumed_amount, reward))
+
+        for user in users:
+            if rewards := rewards_by_user.get(user.id):
+                rewards = await db.run(record_rewards, user.id, rewards)
+            for content_type, series_id, old_amount, consumed_amount, reward in rewards or ():
+                logger.info(f'user {user.id} consumed {consumed_amount - old_amount}'
+                            f' bits of {series_id} ({content_type.domain_suffix})')
+                yield user, reward
+
+        feed_requests = sum(len(content_type.rss_types) for _, content_type in feeds)
+        page_requests = sum(type(scraper).page.has_cache_value(scraper) for scraper in scrapers.values())
+        logger.info(f'rewarded media consumption of {len(users)} users in {time.perf_counter() - start:.1f}s'
+                    f' with {feed_requests} feed and {page_requests} series page requests')
 
     @commands.cooldown(1, 60)
     @commands.command(aliases=['up'])
@@ -77,6 +126,24 @@ class Economy(commands.Cog):
             await ctx.info('Nothing changed...')
 
 
+def record_rewards(db: DB, user_id: int, rewards: list[tuple[type[Content], int, int, int, int]]
+                   ) -> list[tuple[type[Content], int, int, int, int]]:
+    """Pay out all rewards of a user and remember what they were for, in one transaction.
+
+    Rewards for consumption that another sweep recorded since it was read are left out,
+    so that overlapping sweeps don't pay it twice. Returns the rewards that were paid out."""
+    recorded = {(content_type, series_id): amount
+                for content_type, series_id, amount in db.execute(RECORDED_MEDIA_QUERY, [user_id])}
+    rewards = [(content_type, series_id, old_amount, consumed_amount, reward)
+               for content_type, series_id, old_amount, consumed_amount, reward in rewards
+               if recorded.get((content_type.domain_suffix, series_id), 0) == old_amount]
+    db.execute('UPDATE user SET balance=balance+? WHERE id=?', (sum(reward for *_, reward in rewards), user_id))
+    db.executemany('REPLACE INTO consumed_media(user,type,id,amount) VALUES(?,?,?,?)',
+                   [(user_id, content_type.domain_suffix, series_id, consumed_amount)
+                    for content_type, series_id, _, consumed_amount, _ in rewards])
+    return rewards
+
+
 def add_years(date_: str, amount: int) -> str:
     return str(int(date_[:4]) + amount) + date_[4:]
 
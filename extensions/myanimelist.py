@@ -29,21 +29,21 @@ async def find_series(ctx: Context, search_terms: Collection[str], content_type:
     if len(search_terms) == 0:
         raise ExpectedCommandError('Please specify a search query.')
 
-    series_id = await search_first_mal_id(content_type.domain_suffix, ' '.join(search_terms))
+    series_id = await search_first_mal_id(ctx.bot.session, content_type.domain_suffix, ' '.join(search_terms))
     if series_id is None:
         raise ExpectedCommandError("I couldn't find any results.")
 
     embed_msg = await ctx.send("*Getting the information from MyAnimeList.net...*")
     async with ctx.typing():
-        scraper = content_type.from_id(series_id)
+        scraper = content_type.from_id(series_id, ctx.bot.session)
+        await ctx.bot.series_metadata.fill(scraper, content_type.metadata_fields)
         embed = await scraper.to_embed()
         await embed_msg.edit(content=" ", embed=embed)
 
 
-async def search_first_mal_id(domain_suffix: str, query: str) -> Optional[int]:
-    async with aiohttp.ClientSession() as session:
-        search_results = search(f'site:myanimelist.net/{domain_suffix} {query}', session)
-        match = await first_match(rf'https://myanimelist\.net/{domain_suffix}/(\d+)/[^/]+', search_results)
+async def search_first_mal_id(session: aiohttp.ClientSession, domain_suffix: str, query: str) -> Optional[int]:
+    search_results = search(f'site:myanimelist.net/{domain_suffix} {query}', session)
+    match = await first_match(rf'https://myanimelist\.net/{domain_suffix}/(\d+)/[^/]+', search_results)
     if match:
         return int(match.group(1))
 
@@ -1,31 +1,50 @@
 import logging
+import re
 from typing import Union
 
 import discord
 from discord.ext import commands
 
 import utils.trade
+from api.expected_errors import ExpectedCommandError
 from api.my_context import Context
 from api.shinobu import Shinobu
 from data.CONSTANTS import CURRENCY
 from extensions.economy import income_and_new_last_withdrawal
-from utils import database
-from utils.database import Pack, User, DB
-from utils.waifus import buy_pack, CURRENT_PREDICATE, list_waifus, Refund, find_waifu
+from utils.database import Pack, User, AsyncDB, Waifu
+from utils.waifus import buy_pack, buy_packs, CURRENT_PREDICATE, list_waifus, Refund, Upgrade, find_waifu, \
+    DuplicateType, invalidate_waifu_index
 from utils.interactions import waifu_interactions, user_interactions
 
 logger = logging.getLogger(__name__)
 
+MAX_PULLS = 50
+
 
 class Shop(commands.Cog):
     @commands.command(aliases=['p'])
     @utils.trade.forbid
     async def pack(self, ctx: Context, *pack_name: str):
-        """Buy a pack with the given name. List all currently available packs if you don't give a pack name."""
-        db = database.connect()
+        """Buy a pack with the given name. Buy several at once by prefixing the name with e.g. 10x.
+        List all currently available packs if you don't give a pack name."""
+        db = ctx.bot.db
+
+        count = 1
+        if pack_name and (count_match := re.fullmatch(r'(\d+)x', pack_name[0])):
+            count = int(count_match.group(1))
+            pack_name = pack_name[1:]
+            if not 1 <= count <= MAX_PULLS:
+                raise ExpectedCommandError(f"You can only open between 1 and {MAX_PULLS} packs at once!")
 
         if pack_name := ' '.join(pack_name):
-            waifu, duplicate = await buy_pack(db, ctx.author.id, pack_name)
+            if count > 1:
+                pulls = await db.run(buy_packs, ctx.author.id, pack_name, count)
+                invalidate_waifu_index(ctx.author.id)
+                await ctx.send(embed=self.pulls_embed(f'{count}x {pack_name}', pulls))
+                return
+
+            waifu, duplicate = await db.run(buy_pack, ctx.author.id, pack_name)
+            invalidate_waifu_index(ctx.author.id)
             embed = waifu.to_embed()
 
             allow_interactions = True
@@ -42,15 +61,40 @@ class Shop(commands.Cog):
                 await waifu_interactions(ctx=ctx, db=db, msg=msg, waifu=waifu)
 
         else:
-            packs = Pack.select_many(db, f'SELECT * FROM pack WHERE {CURRENT_PREDICATE}')
-
             embed = discord.Embed(colour=discord.Colour.gold())
-            for p in packs:
+            async for p in Pack.async_select_many(db, f'SELECT * FROM pack WHERE {CURRENT_PREDICATE}'):
                 end_date_str = f" (Available until {p.end_date})" if p.end_date else ''
                 embed.add_field(name=f"{p.name} - {p.cost} {CURRENCY}{end_date_str}", value=p.description, inline=False)
 
             await ctx.send(embed=embed)
 
+    @staticmethod
+    def pulls_embed(title: str, pulls: list[tuple[Waifu, DuplicateType]]) -> discord.Embed:
+        lines = []
+        refunded = 0
+        for waifu, duplicate in sorted(pulls, key=lambda p: -p[0].rarity.value):
+            line = f"**{waifu.rarity.name}** {waifu.character.name} [{waifu.character.series}]"
+            if isinstance(duplicate, Refund):
+                line += f" (refunded for {duplicate.amount} {CURRENCY})"
+                refunded += duplicate.amount
+            elif isinstance(duplicate, Upgrade):
+                line += f" (upgraded to **{duplicate.upgraded_rarity.name}**)"
+            lines.append(line)
+
+        description = ''
+        for i, line in enumerate(lines):
+            more = f"\n*...and {len(lines) - i} more*"
+            if len(description) + len(line) + 1 + len(more) > 2048:
+                description += more
+                break
+            description += line + '\n'
+
+        embed = discord.Embed(color=max(pulls, key=lambda p: p[0].rarity.value)[0].rarity.colour,
+                              title=title, description=description)
+        if refunded:
+            embed.add_field(name='Refunds', value=f"{refunded} {CURRENCY}")
+        return embed
+
     @staticmethod
     async def maybe_to_user(ctx: commands.Context, argument: str) -> Union[discord.User, str]:
         try:
@@ -72,22 +116,22 @@ class Shop(commands.Cog):
             if maybe_user:
                 query = maybe_user + ' ' + query
 
-        db = database.connect()
+        db = ctx.bot.db
 
         if query:
-            waifu = find_waifu(db, user.id, query)
+            waifu = await db.read(find_waifu, user.id, query)
             msg = await ctx.send(embed=waifu.to_embed())
             if user == ctx.author:
                 await waifu_interactions(ctx=ctx, db=db, msg=msg, waifu=waifu)
 
         else:
-            waifus = list_waifus(db, user.id)
+            waifus = await db.read(list_waifus, user.id)
             padding = max(len(w.character.name) for w in waifus)
             waifu_str = '\n'.join(f"{w.character.name:<{padding}} - {w.rarity.name}" for w in waifus)
             await ctx.send_paginated(waifu_str, prefix='```md\n', suffix='```')
 
     @staticmethod
-    def income_msg(db: DB, discord_user: discord.User, db_user: User, is_author: bool):
+    async def income_msg(db: AsyncDB, discord_user: discord.User, db_user: User, is_author: bool):
         income, new_last_withdrawal = income_and_new_last_withdrawal(db_user)
 
         if not income:
@@ -95,9 +139,8 @@ class Shop(commands.Cog):
         elif not is_author:
             income_msg = f'  (Has yet to withdraw {income} {CURRENCY})'
         else:
-            with db:
-                db.execute('UPDATE user SET balance=balance+?, last_withdrawal=? WHERE id=?',
-                           [income, new_last_withdrawal, discord_user.id])
+            await db.execute('UPDATE user SET balance=balance+?, last_withdrawal=? WHERE id=?',
+                             [income, new_last_withdrawal, discord_user.id])
             logger.info(f'{discord_user.name} withdrew {income} from their passive income')
             income_msg = f'  (Withdrew {income} {CURRENCY})'
 
@@ -109,16 +152,15 @@ class Shop(commands.Cog):
         maybe_user = await self.maybe_to_user(ctx, user)
         user = maybe_user if isinstance(maybe_user, discord.User) else ctx.author
 
-        db = database.connect()
-        db_user = User.select_one(db, 'SELECT * FROM user WHERE id=?', [user.id])
+        db = ctx.bot.db
+        db_user = await User.async_select_one(db, 'SELECT * FROM user WHERE id=?', [user.id])
 
         embed = discord.Embed(color=discord.colour.Colour.blue(),  # todo custom color
                               title=f'{user}',
                               # description=f"**{self.rarity.name}**" todo custom description
                               )
         embed.set_thumbnail(url=str(user.avatar_url))
-        embed.add_field(name='Balance', value=self.income_msg(db, user, db_user, user == ctx.author))
-        db.close()
+        embed.add_field(name='Balance', value=await self.income_msg(db, user, db_user, user == ctx.author))
         msg = await ctx.send(embed=embed)
         await user_interactions(ctx=ctx, msg=msg, target_user=user)
 
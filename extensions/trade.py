@@ -8,8 +8,8 @@ from discord.ext import commands
 from api.expected_errors import ExpectedCommandError
 from api.my_context import Context
 from api.shinobu import Shinobu
-from utils import database
 from utils.trade import Change, CHANGES, require
+from utils.waifus import invalidate_waifu_index
 
 
 class Trade(commands.Cog):
@@ -40,12 +40,14 @@ class Trade(commands.Cog):
             mention_str = ', '.join(s.mention for s in signers)
             msg = await ctx.send(f"{mention_str}: Do you accept the following changes?\n{changes_str}")
             if await ctx.confirm(msg, users=signers):
-                with database.connect() as db:
+                db = ctx.bot.db
+                async with db:
                     for c in all_changes:
                         await c.execute(db)
                     for s in signers:
                         CHANGES[s].clear()
-                    await ctx.info("Successfully executed transaction.")
+                invalidate_waifu_index(*{user_id for c in all_changes for user_id in (c.from_id, c.to_id)})
+                await ctx.info("Successfully executed transaction.")
             else:
                 raise ExpectedCommandError("Cancelled execution! (Transaction contents are kept)")
 
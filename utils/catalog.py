@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+from collections import defaultdict, Iterable
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from utils.database import DB
+from utils.search import normalise
+from utils.waifus import CURRENT_PREDICATE
+
+
+# Lots of characters share their series (and some their names)
+@lru_cache(maxsize=65536)
+def _tokenise(text: str) -> frozenset[str]:
+    return frozenset(normalise(text).split())
+
+
+class CatalogEntry(NamedTuple):
+    id: int
+    name: str
+    series: str
+    rarity: int
+    batch: str
+
+
+class CatalogChanges(NamedTuple):
+    last_change: int
+    entries: list[CatalogEntry]
+    deleted: set[int]
+    rarity_names: dict[int, str]
+    batch_packs: dict[str, list[str]]
+
+
+class CatalogIndex:
+    """In-memory search over every character by the tokens of their names and series.
+
+    Query tokens match all indexed tokens they are a prefix of. Prefix lookups use binary search over
+    the sorted tokens, which is a lot lighter than a trie of dicts at hundreds of thousands of characters.
+    """
+
+    def __init__(self):
+        self.entries: dict[int, CatalogEntry] = {}
+        self.rarity_names: dict[int, str] = {}
+        self.batch_packs: dict[str, list[str]] = {}
+        self.last_change = 0
+        self._postings: defaultdict[str, set[int]] = defaultdict(set)
+        self._sorted_tokens: Optional[list[str]] = []
+
+    @staticmethod
+    def _tokens(entry: CatalogEntry) -> frozenset[str]:
+        return _tokenise(entry.name) | _tokenise(entry.series)
+
+    def _remove(self, character_id: int):
+        if (old := self.entries.pop(character_id, None)) is not None:
+            for token in self._tokens(old):
+                ids = self._postings[token]
+                ids.discard(character_id)
+                # Otherwise apply wouldn't notice the token coming back and it'd stay out of the sorted tokens
+                if not ids:
+                    del self._postings[token]
+
+    @classmethod
+    def load(cls, db: DB) -> CatalogIndex:
+        index = cls()
+        index.apply(cls.load_changes(db))
+        return index
+
+    def apply(self, changes: CatalogChanges):
+        """Apply changes loaded on any thread by `load_changes`. Must run where searches happen."""
+        for character_id in changes.deleted:
+            self._remove(character_id)
+        for entry in changes.entries:
+            self._remove(entry.id)
+            self.entries[entry.id] = entry
+            for token in self._tokens(entry):
+                if token not in self._postings:
+                    self._sorted_tokens = None
+                self._postings[token].add(entry.id)
+        self.rarity_names = changes.rarity_names
+        self.batch_packs = changes.batch_packs
+        self.last_change = changes.last_change
+
+    @staticmethod
+    def load_changes(db: DB, since: Optional[int] = None) -> CatalogChanges:
+        """Load every character that changed after the change log entry `since`, or all of them if it's None."""
+        last_change = db.execute('SELECT IFNULL(MAX(id), 0) FROM character_change').fetchone()[0]
+        if since is not None:
+            changed = {row[0] for row in db.execute('SELECT character FROM character_change WHERE id > ? AND id <= ?',
+                                                    [since, last_change])}
+            placeholders = ','.join('?' * len(changed))
+            rows = db.execute(f'SELECT id, name, series, rarity, batch FROM character WHERE id IN ({placeholders})',
+                              list(changed))
+        else:
+            changed = set()
+            rows = db.execute('SELECT id, name, series, rarity, batch FROM character')
+        entries = [CatalogEntry(*row) for row in rows]
+
+        batch_packs = defaultdict(list)
+        for batch, pack in db.execute(f"""
+        SELECT batch_in_pack.batch, pack.name FROM batch_in_pack
+        JOIN pack ON pack.name = batch_in_pack.pack
+        WHERE {CURRENT_PREDICATE}
+        ORDER BY pack.name
+        """):
+            batch_packs[batch].append(pack)
+
+        return CatalogChanges(last_change=last_change,
+                              entries=entries,
+                              deleted=changed - {e.id for e in entries},
+                              rarity_names=dict(db.execute('SELECT value, name FROM rarity')),
+                              batch_packs=dict(batch_packs))
+
+    def _matching_ids(self, query_token: str) -> set[int]:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        ids = set()
+        for i in range(bisect.bisect_left(tokens, query_token), len(tokens)):
+            if not tokens[i].startswith(query_token):
+                break
+            # Tokens removed since the sort stay in it until the next one
+            ids |= self._postings.get(tokens[i], set())
+        return ids
+
+    def search(self, query: str, limit: int) -> list[CatalogEntry]:
+        """Characters whose name or series contain every token of the query as a prefix of one of their tokens.
+
+        Exact token matches rank first, then shorter names."""
+        query_tokens = set(normalise(query).split())
+        if not query_tokens:
+            return []
+
+        # Exact tokens usually narrow the results down the most, so start with those
+        candidates: Optional[set[int]] = None
+        for token in sorted(query_tokens, key=lambda t: len(self._postings.get(t, ())) or len(self.entries)):
+            ids = self._matching_ids(token)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        def rank(character_id: int):
+            entry = self.entries[character_id]
+            exact = sum(character_id in self._postings.get(t, ()) for t in query_tokens)
+            return -exact, len(entry.name), entry.name
+
+        return [self.entries[i] for i in heapq.nsmallest(limit, candidates, key=rank)]
+
+    def packs(self, entry: CatalogEntry) -> Iterable[str]:
+        return self.batch_packs.get(entry.batch, ())
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import queue
 import sqlite3
-from collections import defaultdict, Iterator, Generator
-from dataclasses import dataclass
-from functools import partial
+import threading
+from collections import Iterator, Callable, Sequence, Iterable, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from typing import Optional, Union, TypeVar, Any, Final
 
 import discord
@@ -14,14 +19,171 @@ from data.CONSTANTS import DB_PATH
 DB = sqlite3.Connection
 
 
-def connect(db_path=DB_PATH) -> DB:
-    db = sqlite3.connect(db_path)
+PRAGMAS = {
+    # Readers don't block behind the writer and vice versa
+    'journal_mode': 'WAL',
+    # Safe in WAL mode: a power loss can only roll back the last commits, not corrupt the database
+    'synchronous': 'NORMAL',
+    # Negative values are in KiB
+    'cache_size': -16000,
+    'mmap_size': 256 * 2**20,
+    'temp_store': 'MEMORY',
+}
+
+
+def connect(db_path=DB_PATH, **kwargs) -> DB:
+    kwargs.setdefault('cached_statements', 512)
+    db = sqlite3.connect(db_path, **kwargs)
     db.row_factory = sqlite3.Row
+    for pragma, value in PRAGMAS.items():
+        db.execute(f'PRAGMA {pragma}={value}')
     return db
 
 
-def nested_dict() -> defaultdict:
-    return defaultdict(nested_dict)
+class ConnectionPool:
+    """Preconfigured connections that are handed out by `connection()` and always returned afterwards."""
+
+    def __init__(self, db_path=DB_PATH, size: int = 8):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.LifoQueue[DB] = queue.LifoQueue()
+        self._connections: list[DB] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> DB:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if len(self._connections) < self.size:
+                    # Connections are handed to whichever thread needs one next
+                    db = connect(self.db_path, check_same_thread=False)
+                    self._connections.append(db)
+                    return db
+            return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[DB]:
+        db = self._acquire()
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._idle.put(db)
+
+    def close(self):
+        with self._lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
+            self._idle = queue.LifoQueue()
+
+
+_POOLS: dict[Any, ConnectionPool] = {}
+
+
+def pool(db_path=DB_PATH) -> ConnectionPool:
+    """The process-wide connection pool of a database."""
+    if db_path not in _POOLS:
+        _POOLS[db_path] = ConnectionPool(db_path)
+    return _POOLS[db_path]
+
+
+class AsyncDB:
+    """Runs sqlite off the event loop: writes on one dedicated thread and reads on a small pool of threads.
+
+    The writer keeps one connection of the pool for itself, the readers borrow one per call.
+    Outside of a transaction every write is committed on its own.
+    `async with db:` scopes a transaction like `with db:` does for a connection and keeps
+    the writes of other tasks out of it until it's committed or rolled back. Transactions can be nested.
+    """
+
+    def __init__(self, db_path=DB_PATH, readers: int = 4):
+        self.pool = pool(db_path)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._writer_connection = ExitStack()
+        self._writer_db: Optional[DB] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._transaction_task: Optional[asyncio.Task] = None
+        self._transaction_depth = 0
+
+    def _writer_call(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+        # Called on the writer thread
+        if self._writer_db is None:
+            self._writer_db = self._writer_connection.enter_context(self.pool.connection())
+        return func(self._writer_db, *args, **kwargs)
+
+    def _reader_call(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+        # Called on the reader threads
+        with self.pool.connection() as db:
+            return func(db, *args, **kwargs)
+
+    def _in_transaction(self) -> bool:
+        return self._transaction_task is not None and self._transaction_task is asyncio.current_task()
+
+    async def _on_writer(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._writer, lambda: self._writer_call(func, *args, **kwargs))
+
+    async def run(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+        """Call func(connection, *args, **kwargs) on the writer thread."""
+        if self._in_transaction():
+            return await self._on_writer(func, *args, **kwargs)
+
+        def autocommit(db: DB):
+            with db:
+                return func(db, *args, **kwargs)
+
+        async with self._lock():
+            return await self._on_writer(autocommit)
+
+    async def read(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+        """Call func(connection, *args, **kwargs) on a reader thread. func must not write to the database."""
+        if self._in_transaction():
+            # Only the writer connection can see the uncommitted changes of the transaction
+            return await self._on_writer(func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._readers, lambda: self._reader_call(func, *args, **kwargs))
+
+    async def execute(self, sql: str, parameters: Sequence = ()) -> list[sqlite3.Row]:
+        return await self.run(lambda db: db.execute(sql, parameters).fetchall())
+
+    async def executemany(self, sql: str, seq_of_parameters: Iterable[Sequence]):
+        await self.run(lambda db: db.executemany(sql, seq_of_parameters))
+
+    async def fetchall(self, sql: str, parameters: Sequence = ()) -> list[sqlite3.Row]:
+        return await self.read(lambda db: db.execute(sql, parameters).fetchall())
+
+    def _lock(self) -> asyncio.Lock:
+        # Created lazily so that it belongs to the running event loop
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    async def __aenter__(self) -> AsyncDB:
+        if not self._in_transaction():
+            await self._lock().acquire()
+            self._transaction_task = asyncio.current_task()
+        self._transaction_depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._transaction_depth -= 1
+        if self._transaction_depth:
+            return
+        try:
+            await self._on_writer(lambda db: db.commit() if exc_type is None else db.rollback())
+        finally:
+            self._transaction_task = None
+            self._lock().release()
+
+    def close(self):
+        self._readers.shutdown()
+        self._writer.shutdown()
+        self._writer_connection.close()
+        self.pool.close()
 
 
 class _Unavailable:
@@ -35,53 +197,90 @@ _T = TypeVar('_T')
 NonObligatory = Union[_Unavailable, _T]
 _RowDataT = TypeVar('_RowDataT', bound='RowData')
 
-row_dataclass = partial(dataclass, unsafe_hash=True)
+_ROW_DATACLASSES: dict[str, type[RowData]] = {}
+
+
+def row_dataclass(cls: type[_RowDataT]) -> type[_RowDataT]:
+    cls = dataclass(unsafe_hash=True)(cls)
+    # Recreate the class with __slots__ to get rid of the per-instance __dict__
+    # (dataclass(slots=True) is only available from python 3.10 onwards)
+    own_fields = tuple(f.name for f in fields(cls) if f.name in cls.__dict__.get('__annotations__', {}))
+    cls_dict = {k: v for k, v in cls.__dict__.items() if k not in (*own_fields, '__dict__', '__weakref__')}
+    cls_dict['__slots__'] = own_fields
+    cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    _ROW_DATACLASSES[cls.__name__] = cls
+    return cls
 
 
 @row_dataclass
 class RowData:
-    @classmethod
-    def _get_subclasses(cls) -> Generator[type[_RowDataT], None, None]:
-        for subclass in cls.__subclasses__():
-            yield from subclass._get_subclasses()
-            yield subclass
-
     @classmethod
     def _find_subclass(cls, name: str) -> Optional[type[_RowDataT]]:
-        for subclass in cls._get_subclasses():
-            if subclass.__name__ == name:
-                return subclass
+        return _ROW_DATACLASSES.get(name)
 
     @classmethod
-    def _from_tree(cls, tree: dict[str, Any]) -> _RowDataT:
-        for key, value in tree.copy().items():
+    def _compile_tree(cls, tree: dict[str, Any], namespace: dict[str, Any]) -> str:
+        # Leaves of the tree are column indices and inner nodes are nested RowData
+        cls_name = f'_cls{len(namespace)}'
+        namespace[cls_name] = cls
+        kwargs = []
+        for key, value in tree.items():
+            if not key.isidentifier():
+                raise ValueError(f'invalid column name: {key}')
             if isinstance(value, dict):
-                try:
-                    tree[key] = RowData._find_subclass(key.capitalize())._from_tree(value)
-                except AttributeError:
+                if (subclass := RowData._find_subclass(key.capitalize())) is None:
                     raise ValueError('invalid tree')
-        return cls(**tree)
+                # Nested objects are shared between rows (e.g. the User of every Waifu in a collection)
+                kwargs.append(f'{key}=interned.setdefault((_o := {subclass._compile_tree(value, namespace)}), _o)')
+            else:
+                kwargs.append(f'{key}=row[{value}]')
+        return f'{cls_name}({", ".join(kwargs)})'
 
     @classmethod
-    def build(cls, **kwargs) -> _RowDataT:
-        tree: defaultdict[str, Any] = nested_dict()
-        for name, value in kwargs.items():
-            subnames = name.split('.')
+    @lru_cache(maxsize=256)
+    def hydration_plan(cls, columns: tuple[str, ...]) -> Callable[[Sequence, dict], _RowDataT]:
+        """Compile a function that turns rows with the given (dotted) column names into instances of this class.
+
+        Equal nested objects are looked up in and added to the identity map that is passed along with each row."""
+        tree: dict[str, Any] = {}
+        for i, name in enumerate(columns):
+            *subtree_names, leaf_name = name.split('.')
             subtree = tree
-            for subtree_name in subnames[:-1]:
-                subtree = subtree[subtree_name]
-            subtree[subnames[-1]] = value
-        return cls._from_tree(tree)
+            for subtree_name in subtree_names:
+                subtree = subtree.setdefault(subtree_name, {})
+            subtree[leaf_name] = i
+        namespace: dict[str, Any] = {}
+        expression = cls._compile_tree(tree, namespace)
+        return eval(f'lambda row, interned: {expression}', namespace)
+
+    @classmethod
+    def build(cls, **kwargs) -> _RowDataT:
+        return cls.hydration_plan(tuple(kwargs))(tuple(kwargs.values()), {})
+
+    @classmethod
+    def select_one(cls, db: DB, *args, interned: Optional[dict] = None, **kwargs) -> _RowDataT:
+        cursor = db.execute(*args, **kwargs)
+        if row := cursor.fetchone():
+            plan = cls.hydration_plan(tuple(d[0] for d in cursor.description))
+            return plan(row, {} if interned is None else interned)
+
+    @classmethod
+    def select_many(cls, db: DB, *args, interned: Optional[dict] = None, **kwargs) -> Iterator[_RowDataT]:
+        """Pass an identity map as `interned` to share nested objects across several queries."""
+        interned = {} if interned is None else interned
+        cursor = db.execute(*args, **kwargs)
+        plan = cls.hydration_plan(tuple(d[0] for d in cursor.description))
+        for row in cursor:
+            yield plan(row, interned)
 
     @classmethod
-    def select_one(cls, db: DB, *args, **kwargs) -> _RowDataT:
-        if row := db.execute(*args, **kwargs).fetchone():
-            return cls.build(**row)
+    async def async_select_one(cls, db: AsyncDB, *args, **kwargs) -> _RowDataT:
+        return await db.read(cls.select_one, *args, **kwargs)
 
     @classmethod
-    def select_many(cls, db: DB, *args, **kwargs) -> Iterator[_RowDataT]:
-        for row in db.execute(*args, **kwargs):
-            yield cls.build(**row)
+    async def async_select_many(cls, db: AsyncDB, *args, **kwargs) -> AsyncIterator[_RowDataT]:
+        for item in await db.read(lambda conn: list(cls.select_many(conn, *args, **kwargs))):
+            yield item
 
 
 @row_dataclass
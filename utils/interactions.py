@@ -5,23 +5,25 @@ from api.expected_errors import ExpectedCommandError
 from api.my_context import Context
 from data.CONSTANTS import CURRENCY, UPGRADE, TRASH, SEND, CONFIRM, CANCEL
 from extensions.trade import Trade
-from utils.database import DB, Waifu, Rarity
+from utils.database import AsyncDB, Waifu, Rarity
 from utils.trade import add_money, WaifuTransfer, CHANGES, MoneyTransfer
+from utils.waifus import invalidate_waifu_index
 
 
-async def waifu_interactions(ctx: Context, db: DB, msg: discord.Message, waifu: Waifu):
+async def waifu_interactions(ctx: Context, db: AsyncDB, msg: discord.Message, waifu: Waifu):
     # TODO: allow interactions that ctx.author can't react to
     assert waifu.user.id == ctx.author.id
 
     async def trash(user: discord.User, **_):
-        waifu.ensure_ownership(db)
+        await db.read(waifu.ensure_ownership)
         confirmation_msg = await ctx.info(f'Do you really want to refund {waifu.character.name}'
                                           f' for {waifu.rarity.refund} {CURRENCY}?')
         if await ctx.confirm(confirmation_msg):
-            waifu.ensure_ownership(db)
-            with db:
-                add_money(db, user.id, waifu.rarity.refund)
-                db.execute('DELETE FROM waifu WHERE id=?', [waifu.id])
+            async with db:
+                await db.run(waifu.ensure_ownership)
+                await db.run(add_money, user.id, waifu.rarity.refund)
+                await db.execute('DELETE FROM waifu WHERE id=?', [waifu.id])
+            invalidate_waifu_index(user.id)
             embed: discord.Embed = confirmation_msg.embeds[0]
             embed.description = f"Successfully refunded {waifu.character.name} for {waifu.rarity.refund} {CURRENCY}"
             await confirmation_msg.edit(embed=embed)
@@ -29,15 +31,17 @@ async def waifu_interactions(ctx: Context, db: DB, msg: discord.Message, waifu:
             await confirmation_msg.delete()
 
     async def upgrade(user: discord.User, **_):
-        waifu.ensure_ownership(db)
+        await db.read(waifu.ensure_ownership)
         confirmation_msg = await ctx.info(f'Do you really want to upgrade {waifu.character.name}'
                                           f' for {waifu.rarity.upgrade_cost} {CURRENCY}?')
         if await ctx.confirm(confirmation_msg):
-            waifu.ensure_ownership(db)
-            new_rarity = Rarity.select_one(db, 'SELECT * FROM rarity WHERE value=?', [waifu.rarity.value + 1])
-            with db:
-                add_money(db, user.id, -waifu.rarity.upgrade_cost)
-                db.execute('UPDATE waifu SET rarity=? WHERE id=?', [new_rarity.value, waifu.id])
+            new_rarity = await Rarity.async_select_one(db, 'SELECT * FROM rarity WHERE value=?',
+                                                       [waifu.rarity.value + 1])
+            async with db:
+                await db.run(waifu.ensure_ownership)
+                await db.run(add_money, user.id, -waifu.rarity.upgrade_cost)
+                await db.execute('UPDATE waifu SET rarity=? WHERE id=?', [new_rarity.value, waifu.id])
+            invalidate_waifu_index(user.id)
             embed: discord.Embed = confirmation_msg.embeds[0]
             embed.description = f"Successfully upgraded {waifu.character.name} to a **{new_rarity.name}**"
             await confirmation_msg.edit(embed=embed)
@@ -45,7 +49,7 @@ async def waifu_interactions(ctx: Context, db: DB, msg: discord.Message, waifu:
             await confirmation_msg.delete()
 
     async def send(user: discord.User, **_):
-        waifu.ensure_ownership(db)
+        await db.read(waifu.ensure_ownership)
 
         answer = await ctx.quick_question(f'Who do you want to give {waifu.character.name} to?', user)
         if answer is None:
@@ -59,7 +63,7 @@ async def waifu_interactions(ctx: Context, db: DB, msg: discord.Message, waifu:
         transfer = WaifuTransfer(from_id=user.id, to_id=trade_to.id, waifu=waifu)
         change_list = CHANGES[ctx.author]
         async with change_list.lock:
-            waifu.ensure_ownership(db)
+            await db.read(waifu.ensure_ownership)
             change_list.append(transfer)
         queued_msg = await ctx.info(f"Queued action: {transfer}")
         await queue_interactions(ctx, queued_msg)
@@ -1,23 +1,32 @@
+import asyncio
 import re
 from collections import Iterator
 
 import aiohttp
 import feedparser
 
-from utils.database import DB
+from utils.database import AsyncDB
 from utils.mal_scraper import Content
 
+CONSUMED_MEDIA_QUERY = 'SELECT id, amount FROM consumed_media WHERE type=? AND user=?'
 
-async def new_mal_content(db: DB, session: aiohttp.ClientSession, content_type: type[Content], user_id: int,
-                          mal_username: str) -> Iterator[tuple[int, int, int]]:
-    entries = []
-    for rss_type in content_type.rss_types:
-        async with session.get(f"https://myanimelist.net/rss.php?type={rss_type}&u={mal_username}") as resp:
-            feed = feedparser.parse(await resp.text())
-            entries.extend(feed.entries)
 
-    already_rewarded = dict(db.execute('SELECT id, amount FROM consumed_media WHERE type=? AND user=?',
-                                       [content_type.domain_suffix, user_id]))
+async def fetch_mal_entries(session: aiohttp.ClientSession, content_type: type[Content],
+                            mal_username: str, limit: asyncio.Semaphore) -> list:
+    """The entries of all RSS feeds of a user for the content type, which are fetched at once.
+
+    Each request holds the limit while it runs."""
+    async def fetch(rss_type: str) -> list:
+        async with limit, session.get(f"https://myanimelist.net/rss.php?type={rss_type}&u={mal_username}") as resp:
+            return feedparser.parse(await resp.text()).entries
+
+    feeds = await asyncio.gather(*(fetch(rss_type) for rss_type in content_type.rss_types))
+    return [entry for feed in feeds for entry in feed]
+
+
+async def new_mal_content(db: AsyncDB, entries: list, content_type: type[Content],
+                          user_id: int) -> Iterator[tuple[int, int, int]]:
+    already_rewarded = dict(await db.fetchall(CONSUMED_MEDIA_QUERY, [content_type.domain_suffix, user_id]))
 
     # only yield from inside the generator closure to avoid having to use an async generator
     def new_content_generator():
@@ -13,14 +13,16 @@ from async_property import async_cached_property
 
 
 class BaseScraper:
-    def __init__(self, url: str):
+    def __init__(self, url: str, session: aiohttp.ClientSession):
         self.url = url
+        self.session = session
 
     @async_cached_property
     async def page(self) -> str:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.url) as response:
-                return await response.text()
+        # Error pages (like a 429 when myanimelist.net gets too many requests) would scrape to None everywhere
+        async with self.session.get(self.url) as response:
+            response.raise_for_status()
+            return await response.text()
 
     async def _safe_single_match(self, pattern, **kwargs) -> Union[str, tuple[str, ...], None]:
         matches = re.findall(pattern, await self.page, **kwargs)
@@ -38,10 +40,13 @@ class Content(Protocol):
     domain_suffix: ClassVar[str]
     rss_types: ClassVar[Iterable[str]]
     consumed_regex: ClassVar[Pattern]
+    # What utils.series_metadata keeps of the series, and which of it calculate_reward needs
+    metadata_fields: ClassVar[tuple[str, ...]]
+    reward_fields: ClassVar[tuple[str, ...]]
 
     @classmethod
     @abstractmethod
-    def from_id(cls, id_: int) -> _ContentT: raise NotImplementedError
+    def from_id(cls, id_: int, session: aiohttp.ClientSession) -> _ContentT: raise NotImplementedError
 
     @abstractmethod
     async def to_embed(self) -> discord.Embed: raise NotImplementedError
@@ -69,7 +74,8 @@ class _AnimeMangaAgnosticScraper(BaseScraper):
 
     @async_cached_property
     async def thumbnail(self) -> Optional[str]:
-        return await self._safe_single_match(rf'<img(?=.*alt="{self.title}").*src="(.+?)".*>')
+        if title := await self.title:
+            return await self._safe_single_match(rf'<img(?=.*alt="{re.escape(title)}").*src="(.+?)".*>')
 
     @async_cached_property
     async def score(self) -> Optional[float]:
@@ -85,10 +91,12 @@ class Anime(_AnimeMangaAgnosticScraper, Content):
     domain_suffix = 'anime'
     rss_types = {'rwe', 'rw'}
     consumed_regex = re.compile(r'.*- (\d+) of .* episodes')
+    metadata_fields = ('title', 'thumbnail', 'score', 'status', 'duration')
+    reward_fields = ('duration',)
 
     @classmethod
-    def from_id(cls, id_) -> Anime:
-        return cls(f"https://myanimelist.net/anime/{id_}")
+    def from_id(cls, id_, session: aiohttp.ClientSession) -> Anime:
+        return cls(f"https://myanimelist.net/anime/{id_}", session)
 
     async def calculate_reward(self, amount: int) -> int:
         return ((await self.duration).seconds * amount) // 300
@@ -106,6 +114,8 @@ class Manga(_AnimeMangaAgnosticScraper, Content):
     domain_suffix = 'manga'
     rss_types = {'rrm', 'rm'}
     consumed_regex = re.compile(r'.*- (\d+) of .* chapters')
+    metadata_fields = ('title', 'thumbnail', 'score', 'status', 'volumes', 'chapters')
+    reward_fields = ()
 
     async def to_embed(self) -> discord.Embed:
         embed = await super().to_embed()
@@ -116,8 +126,8 @@ class Manga(_AnimeMangaAgnosticScraper, Content):
         return embed
 
     @classmethod
-    def from_id(cls, id_) -> Manga:
-        return cls(f"https://myanimelist.net/manga/{id_}")
+    def from_id(cls, id_, session: aiohttp.ClientSession) -> Manga:
+        return cls(f"https://myanimelist.net/manga/{id_}", session)
 
     async def calculate_reward(self, amount: int) -> int:
         # 5 minutes are rewarded for each chapter.
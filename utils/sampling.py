@@ -0,0 +1,39 @@
+import random
+from collections import Sequence
+
+
+class AliasTable:
+    """Weighted sampling in O(1) per draw using Vose's alias method."""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError('Cannot sample from an empty population')
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError('Total of weights must be greater than zero')
+
+        self._probabilities = [0.0] * n
+        self._aliases = [0] * n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probabilities[less] = scaled[less]
+            self._aliases[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+        # Whatever is left over is (up to floating point errors) exactly 1
+        for i in large + small:
+            self._probabilities[i] = 1.0
+
+    def __len__(self):
+        return len(self._probabilities)
+
+    def sample(self) -> int:
+        """Return a random index, distributed according to the weights."""
+        i = int(random.random() * len(self._probabilities))
+        return i if random.random() < self._probabilities[i] else self._aliases[i]
@@ -0,0 +1,69 @@
+"""Indexes, triggers and cache tables the bot relies on. `migrate` creates whatever is missing from the database."""
+import re
+
+from utils.database import DB
+
+# name -> indexed columns (and the partial index predicate).
+# The columns after the filtered ones let sqlite answer the queries from the index alone.
+INDEXES = {
+    # list_waifus filters by user and give_waifus by user and character
+    'waifu_by_user': 'waifu(user, character, rarity)',
+    # The characters of a pack are looked up by the batches of the pack
+    'character_by_batch': 'character(batch, rarity)',
+    'batch_in_pack_by_pack': 'batch_in_pack(pack, batch, weight)',
+    # CURRENT_PREDICATE
+    'pack_by_dates': 'pack(start_date, end_date)',
+    # mal_rss.new_mal_content
+    'consumed_media_by_user': 'consumed_media(user, type, id, amount)',
+    # The daily birthday check, most users don't have a birthday set
+    'user_by_birthday': 'user(birthday) WHERE birthday IS NOT NULL',
+}
+
+# Every change to the character table gets logged so that the catalog can catch up incrementally,
+# no matter whether it was made by the bot, add_characters.py or by hand
+CHANGE_LOG = """
+CREATE TABLE IF NOT EXISTS character_change(id INTEGER PRIMARY KEY AUTOINCREMENT, character INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS character_insert_log AFTER INSERT ON character
+BEGIN INSERT INTO character_change(character) VALUES(NEW.id); END;
+CREATE TRIGGER IF NOT EXISTS character_update_log AFTER UPDATE ON character
+BEGIN INSERT INTO character_change(character) VALUES(OLD.id), (NEW.id); END;
+CREATE TRIGGER IF NOT EXISTS character_delete_log AFTER DELETE ON character
+BEGIN INSERT INTO character_change(character) VALUES(OLD.id); END;
+"""
+
+# Counts every change to the tables that the pack samplers are built from, so that they know when to rebuild.
+# A single row that stays on the pages sqlite has cached anyway
+CATALOG_TABLES = ('character', 'batch_in_pack', 'rarity', 'pack')
+CATALOG_VERSION = """
+CREATE TABLE IF NOT EXISTS catalog_version(version INTEGER NOT NULL);
+INSERT INTO catalog_version(version) SELECT 0 WHERE NOT EXISTS(SELECT * FROM catalog_version);
+""" + ''.join(f'CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table}\n'
+              f'BEGIN UPDATE catalog_version SET version=version+1; END;\n'
+              for table in CATALOG_TABLES for event in ('INSERT', 'UPDATE', 'DELETE'))
+
+# utils.series_metadata
+SERIES_METADATA = """
+CREATE TABLE IF NOT EXISTS series_metadata(url TEXT PRIMARY KEY, scraped REAL NOT NULL, title TEXT, thumbnail TEXT,
+                                           score REAL, status TEXT, duration INTEGER, volumes INTEGER,
+                                           chapters INTEGER);
+"""
+
+
+def migrate(db: DB):
+    db.executescript(''.join(f'CREATE INDEX IF NOT EXISTS {name} ON {definition};\n'
+                             for name, definition in INDEXES.items())
+                     + CHANGE_LOG + CATALOG_VERSION + SERIES_METADATA)
+
+
+def drop_indexes(db: DB):
+    db.executescript(''.join(f'DROP INDEX IF EXISTS {name};\n' for name in INDEXES))
+
+
+# e.g. "SCAN waifu" or "SCAN TABLE waifu USING COVERING INDEX ..." (before sqlite 3.36) but not "SCAN CONSTANT ROW"
+_SCAN = re.compile(r'SCAN (TABLE )?(?!CONSTANT ROW)(\w+)')
+
+
+def full_scans(db: DB, sql: str, parameters=()) -> list[str]:
+    """The tables that would be scanned from start to end (whether through an index or not) by the query."""
+    plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+    return [match.group(2) for row in plan if (match := _SCAN.match(row['detail']))]
@@ -0,0 +1,62 @@
+import heapq
+from collections import defaultdict, Callable, Sequence
+from typing import Generic, TypeVar, Optional
+
+from fuzzywuzzy import fuzz, utils
+
+_T = TypeVar('_T')
+
+# Only this many of the items sharing the most trigrams with the query are scored
+MAX_CANDIDATES = 250
+# Matches of secondary texts (e.g. the series of a character) rank below equally good name matches
+SECONDARY_WEIGHT = .9
+
+
+def normalise(text: str) -> str:
+    return utils.full_process(text, force_ascii=True)
+
+
+def trigrams(normalised: str) -> set[str]:
+    # Padding marks the start and end of every token
+    padded = f"  {'   '.join(normalised.split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex(Generic[_T]):
+    """Fuzzy search over the names and secondary texts of items.
+
+    The texts are normalised once and put into a trigram index so that only likely candidates get scored.
+    """
+
+    def __init__(self, items: Sequence[_T], name: Callable[[_T], str], secondary: Callable[[_T], str]):
+        self.items = items
+        self._names = [normalise(name(item)) for item in items]
+        self._secondaries = [normalise(secondary(item)) for item in items]
+        self._grams: defaultdict[str, list[int]] = defaultdict(list)
+        secondary_grams = {text: trigrams(text) for text in set(self._secondaries)}
+        for i, (name_, secondary_) in enumerate(zip(self._names, self._secondaries)):
+            for gram in trigrams(name_) | secondary_grams[secondary_]:
+                self._grams[gram].append(i)
+
+    def _score(self, query: str, i: int) -> float:
+        return max(fuzz.token_set_ratio(query, self._names[i], full_process=False),
+                   fuzz.token_set_ratio(query, self._secondaries[i], full_process=False) * SECONDARY_WEIGHT)
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[_T]:
+        """Return the items matching the query best, ordered from best to worst."""
+        query = normalise(query)
+        shared_grams: defaultdict[int, int] = defaultdict(int)
+        for gram in trigrams(query):
+            for i in self._grams.get(gram, ()):
+                shared_grams[i] += 1
+
+        if shared_grams:
+            candidates = heapq.nlargest(MAX_CANDIDATES, shared_grams, key=shared_grams.__getitem__)
+        else:
+            # Nothing looks alike, so settle for the least bad match
+            candidates = range(len(self.items))
+        # Ties are broken by the order of the items
+        candidates = sorted(candidates)
+        best = heapq.nlargest(len(candidates) if limit is None else limit, candidates,
+                              key=lambda i: self._score(query, i))
+        return [self.items[i] for i in best]
@@ -0,0 +1,105 @@
+"""What is known about myanimelist.net series, so that their pages are only scraped again when it might have changed."""
+import logging
+import re
+import time
+from collections import OrderedDict, Iterable
+from datetime import timedelta
+from typing import Any, Optional
+
+from utils.database import AsyncDB, DB
+from utils.mal_scraper import BaseScraper
+
+logger = logging.getLogger(__name__)
+
+SERIES_METADATA_QUERY = 'SELECT * FROM series_metadata WHERE url=?'
+
+_DAY = 24 * 3600
+# How long each field stays fresh, in seconds
+FIELD_TTLS = {
+    'title': 30 * _DAY,
+    'thumbnail': 30 * _DAY,
+    'score': _DAY,
+    'status': _DAY,
+    'duration': 30 * _DAY,
+    'volumes': 7 * _DAY,
+    'chapters': 7 * _DAY,
+}
+# Fields that the page didn't have (or that couldn't be scraped) are looked for again after this long
+MISSING_TTL = _DAY
+# The lengths of finished series don't change anymore
+FINAL_ONCE_FINISHED = {'duration', 'volumes', 'chapters'}
+
+
+def _is_stale(row: dict, field: str, now: float) -> bool:
+    if row[field] is None:
+        return now - row['scraped'] > MISSING_TTL
+    if field in FINAL_ONCE_FINISHED and (row['status'] or '').startswith('Finished'):
+        return False
+    return now - row['scraped'] > FIELD_TTLS[field]
+
+
+def _to_column(field: str, value: Any) -> Any:
+    return value.total_seconds() if field == 'duration' and value is not None else value
+
+
+def _from_column(field: str, value: Any) -> Any:
+    return timedelta(seconds=value) if field == 'duration' and value is not None else value
+
+
+def _store(db: DB, row: dict):
+    columns = ', '.join(row)
+    db.execute(f'REPLACE INTO series_metadata({columns}) VALUES({", ".join("?" * len(row))})', list(row.values()))
+
+
+class SeriesMetadata:
+    """An LRU cache in front of the series_metadata table, which is in front of the scrapers."""
+
+    def __init__(self, db: AsyncDB, size: int = 1024):
+        self.db = db
+        self.size = size
+        self._rows: OrderedDict[str, dict] = OrderedDict()  # url -> row
+
+    async def fill(self, scraper: BaseScraper, fields: Iterable[str]):
+        """Give the scraper the fields it'd scrape from its page, which is only scraped (for all of them)
+        if one of the fields isn't known or is stale."""
+        fields = list(fields)
+        if not fields:
+            return
+        row = await self._load(scraper.url)
+        if row is None or any(_is_stale(row, field, time.time()) for field in fields):
+            row = await self._scrape(scraper, fields)
+        for field in type(scraper).metadata_fields:
+            setattr(scraper, field, _from_column(field, row[field]))
+
+    async def _load(self, url: str) -> Optional[dict]:
+        row = self._rows.get(url)
+        if row is None:
+            rows = await self.db.fetchall(SERIES_METADATA_QUERY, [url])
+            if not rows:
+                return None
+            row = dict(rows[0])
+        self._remember(url, row)
+        return row
+
+    async def _scrape(self, scraper: BaseScraper, fields: list[str]) -> dict:
+        row = {'url': scraper.url, 'scraped': time.time()}
+        for field in fields:
+            row[field] = _to_column(field, await getattr(scraper, field))
+        # The page is fetched by now. Quirks of the fields nobody asked for mustn't fail the caller
+        for field in type(scraper).metadata_fields:
+            if field not in row:
+                try:
+                    row[field] = _to_column(field, await getattr(scraper, field))
+                except (ValueError, re.error) as ex:
+                    logger.warning(f"couldn't scrape the {field} of {scraper.url}: {ex!r}")
+                    row[field] = None
+        await self.db.run(_store, row)
+        self._remember(scraper.url, row)
+        # Columns of the fields that the scraper doesn't have
+        return {**dict.fromkeys(FIELD_TTLS), **row}
+
+    def _remember(self, url: str, row: dict):
+        self._rows[url] = row
+        self._rows.move_to_end(url)
+        while len(self._rows) > self.size:
+            self._rows.popitem(last=False)
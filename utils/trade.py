@@ -11,7 +11,7 @@ import discord
 from api.expected_errors import ExpectedCommandError
 from api.my_context import Context
 from data.CONSTANTS import CURRENCY
-from utils.database import DB, Waifu
+from utils.database import DB, AsyncDB, Waifu
 
 change_dataclass = partial(dataclass, frozen=True)
 
@@ -33,7 +33,7 @@ class Change(Protocol):
             raise ExpectedCommandError("You can't give something to yourself!")
 
     @abstractmethod
-    async def execute(self, db: DB): ...
+    async def execute(self, db: AsyncDB): ...
 
     @abstractmethod
     def __str__(self): ...
@@ -43,9 +43,9 @@ class Change(Protocol):
 class WaifuTransfer(Change):
     waifu: Waifu
 
-    async def execute(self, db: DB):
+    async def execute(self, db: AsyncDB):
         try:
-            db.execute('UPDATE waifu SET user=? WHERE id=?', [self.to_id, self.waifu.id])
+            await db.execute('UPDATE waifu SET user=? WHERE id=?', [self.to_id, self.waifu.id])
         except sqlite3.IntegrityError:
             raise ExpectedCommandError("You can't give someone a waifu they already own!")
 
@@ -64,10 +64,10 @@ class MoneyTransfer(Change):
         if self.amount <= 0:
             raise ExpectedCommandError(f"You can only transfer positive amounts of {CURRENCY}!")
 
-    async def execute(self, db: DB):
-        with db:
-            add_money(db, self.from_id, -self.amount)
-            add_money(db, self.to_id, self.amount)
+    async def execute(self, db: AsyncDB):
+        async with db:
+            await db.run(add_money, self.from_id, -self.amount)
+            await db.run(add_money, self.to_id, self.amount)
 
     def __str__(self):
         return f"<@{self.from_id}> gives {self.amount} {CURRENCY} to <@{self.to_id}>"
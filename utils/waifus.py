@@ -1,16 +1,21 @@
-import random
-from collections import Generator
-from dataclasses import dataclass
-from typing import Union
+from __future__ import annotations
 
-from fuzzywuzzy import process, fuzz
+import bisect
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Union, Optional
 
 from api.expected_errors import ExpectedCommandError
-from utils.database import DB, Waifu, Pack, Character, User, Rarity
+from utils.database import DB, Waifu, Pack, Character, User, Rarity, Batch
+from utils.sampling import AliasTable
+from utils.search import FuzzyIndex
 from utils.trade import add_money
 
 CURRENT_PREDICATE = "((pack.start_date <= DATE('NOW', 'LOCALTIME')) " \
                     " AND (pack.end_date IS NULL OR pack.end_date >= DATE('NOW', 'LOCALTIME')))"
+CURRENT_PACK_QUERY = f'SELECT * FROM pack WHERE {CURRENT_PREDICATE} AND name LIKE ?'
 
 
 @dataclass(frozen=True)
@@ -26,133 +31,204 @@ class Upgrade:
 DuplicateType = Union[Refund, Upgrade, None]
 
 
-async def buy_pack(db: DB, user_id: int, pack_name: str) -> tuple[Waifu, DuplicateType]:
+def buy_pack(db: DB, user_id: int, pack_name: str) -> tuple[Waifu, DuplicateType]:
+    [pull] = buy_packs(db, user_id, pack_name, 1)
+    return pull
+
+
+def buy_packs(db: DB, user_id: int, pack_name: str, count: int) -> list[tuple[Waifu, DuplicateType]]:
     with db:
         user = User.select_one(db, 'SELECT * FROM user WHERE id=?', [user_id])
-        pack = Pack.select_one(db, f'SELECT * FROM pack WHERE {CURRENT_PREDICATE} AND name LIKE ?', [pack_name])
+        pack = Pack.select_one(db, CURRENT_PACK_QUERY, [pack_name])
         if pack is None:
             raise ExpectedCommandError(f"There's no pack named {pack_name}!")
 
-        add_money(db, user.id, -pack.cost)
-        character, rarity = pick_from_pack(db, pack.name)
-        return give_waifu(db, user, character, rarity)
+        add_money(db, user.id, -pack.cost * count)
+        sampler = pack_sampler(db, pack.name)
+        return give_waifus(db, user, [sampler.pick() for _ in range(count)], sampler.rarities)
 
 
 def pick_from_pack(db: DB, pack_name: str) -> tuple[Character, Rarity]:
-    rarity = pick_rarity(db)
-    character = pick_character(db, pack_name, rarity.value)
-    return character, rarity
-
-
-def pick(*args, **kwargs):
-    return random.choices(*args, **kwargs)[0]
-
-
-def pick_rarity(db: DB) -> Rarity:
-    rarities = db.execute('SELECT * FROM rarity').fetchall()
-    return Rarity.build(**pick(rarities, weights=(r['weight'] for r in rarities)))
-
-
-def pick_character(db: DB, pack_name: str, rarity_val: int) -> Character:
-    chars = [dict(c) for c in db.execute("""
-    SELECT character.id,
-           character.name,
-           character.image_url,
-           character.series,
-           character.rarity AS 'rarity.value',
-           character.batch AS 'batch.name',
-           MAX(batch_in_pack.weight) AS __weight__
-    FROM character
-    JOIN batch_in_pack      ON batch_in_pack.batch = character.batch
-    JOIN rarity             ON rarity.value >= character.rarity
-    WHERE batch_in_pack.pack = ? AND rarity.value = ?
-    GROUP BY character.id
-    """, [pack_name, rarity_val])]
-    weights = [c.pop('__weight__') for c in chars]
-    return Character.build(**pick(chars, weights=weights))
-
-
-def give_waifu(db: DB, user: User, character: Character, new_rarity: Rarity) -> tuple[Waifu, DuplicateType]:
-    waifu = Waifu.select_one(db, """
-    SELECT waifu.id, waifu.rarity AS 'rarity.value',
-           waifu.character AS 'character.id', waifu.user AS 'user.id'
-    FROM waifu WHERE user=? AND character=?
-    """, [user.id, character.id])
-
-    if waifu is None:
-        waifu_id = db.execute('INSERT INTO waifu(user, character, rarity) VALUES(?, ?, ?)',
-                              [user.id, character.id, new_rarity.value]).lastrowid
-        waifu = Waifu(id=waifu_id, character=character, rarity=new_rarity, user=user)
-        duplicate = None
-
-    elif waifu.rarity.value == new_rarity.value and new_rarity.auto_upgrade:
-        new_rarity = Rarity.select_one(db, 'SELECT * FROM rarity WHERE value=?', [waifu.rarity.value + 1])
-        db.execute('UPDATE waifu SET rarity=? WHERE id=?', [new_rarity.value, waifu.id])
-        duplicate = Upgrade(new_rarity)
-
-    else:
-        waifu.rarity = Rarity.select_one(db, 'SELECT * FROM rarity WHERE value=?', [waifu.rarity.value])
-        lower, higher = sorted((new_rarity, waifu.rarity), key=lambda r: r.value)
-        db.execute('UPDATE waifu SET rarity=? WHERE id=?', [higher.value, waifu.id])
-        duplicate = Refund(lower.refund)
-        add_money(db, user.id, duplicate.amount)
-
-    waifu.rarity = new_rarity
-    waifu.character = character
-    waifu.user = user
-
-    return waifu, duplicate
-
-
-def find_waifu(*args, **kwargs) -> Waifu:
+    return pack_sampler(db, pack_name).pick()
+
+
+PACK_CHARACTERS_QUERY = """
+SELECT character.id, character.name, character.image_url, character.series,
+       character.rarity, character.batch, MAX(batch_in_pack.weight) AS weight
+FROM character
+JOIN batch_in_pack ON batch_in_pack.batch = character.batch
+WHERE batch_in_pack.pack = ?
+GROUP BY character.id
+"""
+
+
+class PackSampler:
+    """Precomputed alias tables for drawing a rarity and then a character of a pack."""
+
+    def __init__(self, rarities: list[Rarity], char_rows: list[sqlite3.Row]):
+        self.rarities = rarities
+        self._rarity_table = AliasTable([r.weight for r in rarities])
+        # A rarity can drop any character whose base rarity is lower or equal,
+        # so when sorted by base rarity the eligible characters are a prefix of the list.
+        # Characters are only built once they're drawn.
+        self._char_rows = sorted(char_rows, key=lambda c: c['rarity'])
+        weights = [c['weight'] for c in self._char_rows]
+        base_rarities = [c['rarity'] for c in self._char_rows]
+        self._char_tables: dict[int, AliasTable] = {}
+        for r in rarities:
+            if eligible := bisect.bisect_right(base_rarities, r.value):
+                self._char_tables[r.value] = AliasTable(weights[:eligible])
+
+    @classmethod
+    def load(cls, db: DB, pack_name: str) -> PackSampler:
+        rarities = list(Rarity.select_many(db, 'SELECT * FROM rarity ORDER BY value'))
+        char_rows = db.execute(PACK_CHARACTERS_QUERY, [pack_name]).fetchall()
+        return cls(rarities, char_rows)
+
+    def pick(self) -> tuple[Character, Rarity]:
+        rarity = self.rarities[self._rarity_table.sample()]
+        try:
+            table = self._char_tables[rarity.value]
+        except KeyError:
+            raise ExpectedCommandError(f"This pack doesn't contain any {rarity.name} characters!")
+        row = self._char_rows[table.sample()]
+        character = Character(id=row['id'], name=row['name'], image_url=row['image_url'], series=row['series'],
+                              rarity=Rarity(value=row['rarity']), batch=Batch(name=row['batch']))
+        return character, rarity
+
+
+# pack name -> the catalog_version the sampler was loaded at and the sampler.
+# The version is bumped by triggers (see utils.schema), no matter which process changed the catalog.
+_SAMPLERS: dict[str, tuple[int, PackSampler]] = {}
+
+
+def pack_sampler(db: DB, pack_name: str) -> PackSampler:
+    version = db.execute('SELECT version FROM catalog_version').fetchone()[0]
+    cached = _SAMPLERS.get(pack_name)
+    if cached is None or cached[0] != version:
+        cached = _SAMPLERS[pack_name] = version, PackSampler.load(db, pack_name)
+    return cached[1]
+
+
+# Formatted with the placeholders of the character ids
+OWNED_CHARACTERS_QUERY = 'SELECT character, rarity FROM waifu WHERE user=? AND character IN ({})'
+
+
+def give_waifus(db: DB, user: User, pulls: list[tuple[Character, Rarity]], rarities: list[Rarity]
+                ) -> list[tuple[Waifu, DuplicateType]]:
+    """Resolve duplicates of all pulls in memory and then persist them at once.
+
+    Must be called inside of a transaction."""
+    rarity_by_value = {r.value: r for r in rarities}
+    char_ids = {c.id for c, _ in pulls}
+    placeholders = ','.join('?' * len(char_ids))
+    owned: dict[int, int] = dict(db.execute(OWNED_CHARACTERS_QUERY.format(placeholders), [user.id, *char_ids]))
+    previous = owned.copy()
+
+    results: list[tuple[Character, Rarity, DuplicateType]] = []
+    refund = 0
+    for character, new_rarity in pulls:
+        if character.id not in owned:
+            owned[character.id] = new_rarity.value
+            duplicate = None
+
+        elif owned[character.id] == new_rarity.value and new_rarity.auto_upgrade:
+            new_rarity = rarity_by_value[new_rarity.value + 1]
+            owned[character.id] = new_rarity.value
+            duplicate = Upgrade(new_rarity)
+
+        else:
+            lower, higher = sorted((new_rarity.value, owned[character.id]))
+            owned[character.id] = higher
+            duplicate = Refund(rarity_by_value[lower].refund)
+            refund += duplicate.amount
+
+        results.append((character, new_rarity, duplicate))
+
+    db.executemany('INSERT INTO waifu(user, character, rarity) VALUES(?, ?, ?)',
+                   [(user.id, c, owned[c]) for c in char_ids - previous.keys()])
+    db.executemany('UPDATE waifu SET rarity=? WHERE user=? AND character=?',
+                   [(owned[c], user.id, c) for c in previous if owned[c] != previous[c]])
+    if refund:
+        add_money(db, user.id, refund)
+
+    waifu_ids = dict(db.execute(f'SELECT character, id FROM waifu WHERE user=? AND character IN ({placeholders})',
+                                [user.id, *char_ids]))
+    return [(Waifu(id=waifu_ids[c.id], character=c, rarity=r, user=user), duplicate) for c, r, duplicate in results]
+
+
+def find_waifu(db: DB, user_id: int, query: str) -> Waifu:
     try:
-        return next(find_waifus(*args, **kwargs))
-    except StopIteration:
+        return find_waifus(db, user_id, query, limit=1)[0]
+    except IndexError:
         raise ExpectedCommandError("You don't have any waifus!")
 
 
-def find_waifus(db: DB, user_id: int, query: str) -> Generator[Waifu, None, None]:
-    waifus = list_waifus(db, user_id)
-    if not waifus:
-        raise StopIteration
-
-    matches = process.extract(query, (w.character.name for w in waifus), limit=None, scorer=fuzz.token_set_ratio)
-    for m in matches:
-        for i, w in enumerate(waifus):
-            if w.character.name == m[0]:
-                found_i = i
-                break
-        else:
-            continue
-        yield waifus.pop(found_i)
+# The indices of the users who searched their waifus most recently
+WAIFU_INDICES_SIZE = 256
+_WAIFU_INDICES: OrderedDict[int, FuzzyIndex[Waifu]] = OrderedDict()
+# Bumped by every invalidation, so that an index built from data read before it isn't stored afterwards
+_WAIFU_GENERATIONS: Counter[int] = Counter()
+# Indices are built on the reader threads
+_WAIFU_INDICES_LOCK = threading.Lock()
+
+
+def find_waifus(db: DB, user_id: int, query: str, limit: Optional[int] = None) -> list[Waifu]:
+    with _WAIFU_INDICES_LOCK:
+        if (index := _WAIFU_INDICES.get(user_id)) is not None:
+            _WAIFU_INDICES.move_to_end(user_id)
+        generation = _WAIFU_GENERATIONS[user_id]
+    if index is None:
+        index = FuzzyIndex(list_waifus(db, user_id),
+                           name=lambda w: w.character.name,
+                           secondary=lambda w: w.character.series)
+        with _WAIFU_INDICES_LOCK:
+            if _WAIFU_GENERATIONS[user_id] == generation:
+                _WAIFU_INDICES[user_id] = index
+                while len(_WAIFU_INDICES) > WAIFU_INDICES_SIZE:
+                    _WAIFU_INDICES.popitem(last=False)
+    return index.search(query, limit)
+
+
+def invalidate_waifu_index(*user_ids: int):
+    """Must be called whenever a waifu of one of the users is inserted, updated or deleted.
+
+    Call it after committing, otherwise the index could be rebuilt from the old data in the meantime."""
+    with _WAIFU_INDICES_LOCK:
+        for user_id in user_ids:
+            _WAIFU_INDICES.pop(user_id, None)
+            _WAIFU_GENERATIONS[user_id] += 1
+
+
+LIST_WAIFUS_QUERY = """
+SELECT waifu.id,
+       -- Character
+           character.id AS "character.id",
+           character.name AS "character.name",
+           character.image_url AS "character.image_url",
+           character.series AS "character.series",
+       -- Rarity
+           rarity.value AS "rarity.value",
+           rarity.name AS "rarity.name",
+           rarity.colour AS "rarity.colour",
+           rarity.refund AS "rarity.refund",
+           rarity.upgrade_cost AS "rarity.upgrade_cost",
+           rarity.auto_upgrade AS "rarity.auto_upgrade",
+       -- User
+           user.id AS "user.id",
+           user.balance AS "user.balance",
+           user.last_withdrawal AS "user.last_withdrawal",
+           user.birthday AS "user.birthday",
+           user.mal_username AS "user.mal_username"
+FROM waifu
+JOIN character ON character.id = waifu.character
+JOIN rarity ON rarity.value = waifu.rarity
+JOIN user ON user.id = waifu.user
+WHERE user.id = ?
+ORDER BY rarity.value DESC,
+         character.name ASC
+"""
 
 
 def list_waifus(db: DB, user_id: int) -> list[Waifu]:
-    return list(Waifu.select_many(db, """
-    SELECT waifu.id,
-           -- Character
-               character.id AS "character.id",
-               character.name AS "character.name",
-               character.image_url AS "character.image_url",
-               character.series AS "character.series",
-           -- Rarity
-               rarity.value AS "rarity.value",
-               rarity.name AS "rarity.name",
-               rarity.colour AS "rarity.colour",
-               rarity.refund AS "rarity.refund",
-               rarity.upgrade_cost AS "rarity.upgrade_cost",
-               rarity.auto_upgrade AS "rarity.auto_upgrade",
-           -- User
-               user.id AS "user.id",
-               user.balance AS "user.balance",
-               user.last_withdrawal AS "user.last_withdrawal",
-               user.birthday AS "user.birthday",
-               user.mal_username AS "user.mal_username"
-    FROM waifu
-    JOIN character ON character.id = waifu.character
-    JOIN rarity ON rarity.value = waifu.rarity
-    JOIN user ON user.id = waifu.user
-    WHERE user.id = ?
-    ORDER BY rarity.value DESC,
-             character.name ASC
-    """, [user_id]))
+    return list(Waifu.select_many(db, LIST_WAIFUS_QUERY, [user_id]))